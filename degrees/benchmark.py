@@ -0,0 +1,502 @@
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import degrees
+import graph
+import landmarks
+import util
+
+
+def generate_dataset(directory, n_people, n_movies, cast_size, seed=0,
+                     blockbusters=0, blockbuster_cast=0):
+    """
+    Write a synthetic people.csv, movies.csv and stars.csv into `directory`.
+
+    Casts are drawn with a heavy tail, so a few people appear in many
+    movies, roughly like the IMDb data. The first `blockbusters` movies
+    get casts of `blockbuster_cast` people instead.
+    """
+    rng = random.Random(seed)
+    with open(os.path.join(directory, "people.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "birth"])
+        for i in range(n_people):
+            writer.writerow([i, _random_name(rng), 1900 + i % 100])
+
+    with open(os.path.join(directory, "movies.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "title", "year"])
+        for i in range(n_movies):
+            writer.writerow([i, f"Movie {i}", 1950 + i % 70])
+
+    with open(os.path.join(directory, "stars.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["person_id", "movie_id"])
+        for movie in range(n_movies):
+            cast = set()
+            size = blockbuster_cast if movie < blockbusters else cast_size
+            for _ in range(size):
+                cast.add(int(n_people * rng.random() ** 2))
+            for person in cast:
+                writer.writerow([person, movie])
+
+
+def _random_name(rng):
+    """
+    Return a made-up "First Last" name built from random syllables.
+    """
+    syllables = ["al", "an", "ber", "bo", "ca", "da", "el", "en", "fa",
+                 "gar", "ha", "is", "jo", "ka", "li", "ma", "ne", "ol",
+                 "pa", "ri", "sa", "son", "ta", "to", "va", "wi", "za"]
+
+    def word(length):
+        return "".join(rng.choice(syllables) for _ in range(length))
+    return f"{word(rng.randint(1, 3)).title()} {word(rng.randint(2, 4)).title()}"
+
+
+def reset():
+    """
+    Forget any data loaded into the `degrees` module.
+    """
+    degrees.names.clear()
+    degrees.people.clear()
+    degrees.movies.clear()
+    degrees.graph = None
+
+
+@contextmanager
+def dataset(args):
+    """
+    Yield `args.directory`, or a temporary synthetic dataset
+    when none is given.
+    """
+    if args.directory:
+        yield args.directory
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        generate_dataset(directory, args.people, args.movies, args.cast,
+                         blockbusters=getattr(args, "blockbusters", 0),
+                         blockbuster_cast=getattr(args, "blockbuster_cast", 0))
+        yield directory
+
+
+def load(args):
+    """
+    Load `args.directory`, or a synthetic dataset when none is given.
+    """
+    reset()
+    with dataset(args) as directory:
+        degrees.load_data(directory, compact=args.compact)
+
+
+def random_pairs(n, seed=0):
+    """
+    Return `n` random (source, target) pairs of loaded person ids.
+    """
+    rng = random.Random(seed)
+    ids = sorted(
+        degrees.graph.person_id(person) for person in degrees.graph.states())
+    return [(rng.choice(ids), rng.choice(ids)) for _ in range(n)]
+
+
+def check_path(source, target, path):
+    """
+    Raise an exception unless `path` really connects source to target.
+    """
+    person = source
+    for step in path:
+        if step not in degrees.neighbors_for_person(person):
+            raise Exception(f"invalid path from {source} to {target}")
+        person = step[1]
+    if person != target:
+        raise Exception(f"path from {source} does not end at {target}")
+
+
+def time_searches(searches, pairs):
+    """
+    Run every search on every pair, check that they agree on the
+    number of degrees and print the time each one took.
+    """
+    lengths = {}
+    for name in searches:
+        search = degrees.SEARCHES[name]
+        start = time.perf_counter()
+        results = [search(source, target) for source, target in pairs]
+        elapsed = time.perf_counter() - start
+        for (source, target), path in zip(pairs, results):
+            if path is not None:
+                check_path(source, target, path)
+        lengths[name] = [None if path is None else len(path)
+                         for path in results]
+        print(f"{name:>23}: {elapsed:.3f}s "
+              f"({elapsed / len(pairs) * 1000:.2f} ms/query)")
+
+    first = lengths[searches[0]]
+    for name in searches[1:]:
+        if lengths[name] != first:
+            raise Exception(f"{name} disagrees with {searches[0]}")
+
+
+def bench_search(args):
+    load(args)
+    pairs = random_pairs(args.queries)
+    print(f"{len(degrees.graph)} people, {len(pairs)} random pairs")
+    time_searches(args.searches, pairs)
+
+
+def bench_frontier(args):
+    frontiers = {
+        "StackFrontier": util.StackFrontier,
+        "QueueFrontier": util.QueueFrontier,
+        "DequeStackFrontier": util.DequeStackFrontier,
+        "DequeQueueFrontier": util.DequeQueueFrontier,
+    }
+    rng = random.Random(0)
+    for size in args.sizes:
+        print(f"frontier of {size} nodes, {args.ops} operations each")
+        probes = [rng.randrange(2 * size) for _ in range(args.ops)]
+        for name, frontier_class in frontiers.items():
+            frontier = frontier_class()
+            start = time.perf_counter()
+            for state in range(size):
+                frontier.add(util.Node(state, None, None))
+            add = (time.perf_counter() - start) / size
+
+            start = time.perf_counter()
+            for state in probes:
+                frontier.contains_state(state)
+            contains = (time.perf_counter() - start) / args.ops
+
+            start = time.perf_counter()
+            for _ in range(args.ops):
+                frontier.remove()
+            remove = (time.perf_counter() - start) / args.ops
+
+            print(f"  {name:>18}: add {add * 1e6:9.2f} us  "
+                  f"contains {contains * 1e6:9.2f} us  "
+                  f"remove {remove * 1e6:9.2f} us")
+
+
+def bench_load(args):
+    """
+    Time loading the CSVs into dictionaries, into a CompactGraph,
+    and through a snapshot, both when it has to be written (cold)
+    and when it can be mapped (warm).
+    """
+    with dataset(args) as directory:
+        snapshot = os.path.join(directory, graph.SNAPSHOT_FILE)
+        if os.path.exists(snapshot):
+            os.remove(snapshot)
+
+        loads = [
+            ("dictionaries", {}),
+            ("compact", {"compact": True}),
+            ("snapshot cold", {"snapshot": True}),
+            ("snapshot warm", {"snapshot": True}),
+        ]
+        for name, options in loads:
+            reset()
+            start = time.perf_counter()
+            degrees.load_data(directory, **options)
+            elapsed = time.perf_counter() - start
+            print(f"{name:>15}: {elapsed:.3f}s")
+        print(f"snapshot size: {os.path.getsize(snapshot) / 2 ** 20:.1f} MiB")
+
+
+def bench_batch(args):
+    """
+    Compare answering pairs one by one with `batch_paths`, which
+    shares one search tree between the pairs with a common source.
+    """
+    load(args)
+    rng = random.Random(0)
+    sources = [source for source, _ in random_pairs(args.sources)]
+    targets = [target for _, target in random_pairs(args.sources * 100)]
+    pairs = [
+        (source, rng.choice(targets))
+        for source in sources for _ in range(args.targets)
+    ]
+    print(f"{len(degrees.graph)} people, {len(pairs)} pairs "
+          f"from {len(sources)} sources")
+
+    start = time.perf_counter()
+    single = [degrees.shortest_path(source, target) for source, target in pairs]
+    elapsed = time.perf_counter() - start
+    print(f"  one by one: {elapsed:.3f}s ({len(pairs) / elapsed:.0f} pairs/s)")
+
+    start = time.perf_counter()
+    batch = [path for _, _, path in degrees.batch_paths(pairs)]
+    elapsed = time.perf_counter() - start
+    print(f"     batched: {elapsed:.3f}s ({len(pairs) / elapsed:.0f} pairs/s)")
+
+    if ([None if path is None else len(path) for path in single] !=
+            [None if path is None else len(path) for path in batch]):
+        raise Exception("batched paths disagree with shortest_path")
+
+    source = next(
+        (source for source in sources if degrees.neighbors_for_person(source)),
+        sources[0])
+    start = time.perf_counter()
+    distances = degrees.distances_from(source)
+    elapsed = time.perf_counter() - start
+    print(f"one to all: {len(distances)} people in {elapsed:.3f}s")
+
+
+def bench_workers(args):
+    """
+    Measure batch query throughput as the number of workers grows.
+    """
+    load(args)
+    pairs = random_pairs(args.queries)
+    print(f"{len(degrees.graph)} people, {len(pairs)} random pairs, "
+          f"{os.cpu_count()} CPUs")
+    baseline = None
+    for workers in args.workers:
+        start = time.perf_counter()
+        for _ in degrees.batch_paths(pairs, workers):
+            pass
+        elapsed = time.perf_counter() - start
+        throughput = len(pairs) / elapsed
+        baseline = baseline or throughput
+        print(f"  {workers:>3} workers: {throughput:9.0f} pairs/s "
+              f"({throughput / baseline:.2f}x)")
+
+
+def bench_landmarks(args):
+    """
+    Time building the landmark index, check its bounds against real
+    distances and compare ALT search with plain and bidirectional BFS.
+    """
+    args.compact = True
+    with dataset(args) as directory:
+        reset()
+        degrees.load_data(directory, compact=True)
+        index_file = os.path.join(directory, landmarks.INDEX_FILE)
+        if os.path.exists(index_file):
+            os.remove(index_file)
+
+        start = time.perf_counter()
+        degrees.load_landmarks(directory, args.count)
+        print(f"{len(degrees.graph)} people, built {args.count} landmarks "
+              f"in {time.perf_counter() - start:.3f}s")
+        start = time.perf_counter()
+        degrees.load_landmarks(directory, args.count)
+        print(f"mapped saved index in {time.perf_counter() - start:.4f}s")
+
+    pairs = random_pairs(args.queries)
+    exact = 0
+    for source, target in pairs:
+        path = degrees.shortest_path_bidirectional(source, target)
+        lower, upper = degrees.distance_bounds(source, target)
+        length = float("inf") if path is None else len(path)
+        if not lower <= length <= upper:
+            raise Exception(f"bounds {lower}..{upper} miss {length}")
+        exact += lower == upper
+    print(f"bounds exact for {exact} of {len(pairs)} pairs")
+    time_searches(args.searches, pairs)
+
+
+def bench_hubs(args):
+    """
+    Compare searches with and without collapsed movie expansion on a
+    dataset with a few blockbusters whose casts are shared by hubs.
+    """
+    load(args)
+    pairs = random_pairs(args.queries)
+    print(f"{len(degrees.graph)} people, {args.blockbusters} blockbusters "
+          f"of {args.blockbuster_cast} stars, {len(pairs)} random pairs")
+    time_searches(args.searches, pairs)
+
+
+# load_data options for each loader measured by `bench_memory`
+LOADERS = {
+    "dictionaries": {},
+    "compact": {"compact": True},
+    "lazy": {"lazy": True},
+    "snapshot": {"snapshot": True},
+}
+
+
+def peak_rss():
+    """
+    Return this process's peak resident set size in MiB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def bench_rss(args):
+    """
+    Load the dataset with one loader and print the peak RSS before
+    and after as JSON; run by `bench_memory` in a fresh process.
+    """
+    before = peak_rss()
+    start = time.perf_counter()
+    degrees.load_data(args.directory, **LOADERS[args.loader])
+    elapsed = time.perf_counter() - start
+    print(json.dumps([before, peak_rss(), elapsed]))
+
+
+def bench_memory(args):
+    """
+    Report the peak RSS of each loader, each in its own process so
+    the peaks do not mix. The snapshot is written by a first,
+    unreported run, so the reported one maps it.
+    """
+    def run(loader):
+        result = subprocess.run(
+            [sys.executable, __file__, "--directory", directory,
+             "rss", loader],
+            capture_output=True, text=True, check=True)
+        return json.loads(result.stdout)
+
+    with dataset(args) as directory:
+        run("snapshot")
+        for loader in LOADERS:
+            before, after, elapsed = run(loader)
+            print(f"{loader:>15}: peak RSS {before:7.1f} MiB before, "
+                  f"{after:7.1f} MiB after ({elapsed:.2f}s)")
+
+
+def bench_names(args):
+    """
+    Time building the name index and answering exact, prefix and
+    misspelled-name queries.
+    """
+    with dataset(args) as directory:
+        reset()
+        start = time.perf_counter()
+        degrees.load_data(directory, **LOADERS[args.loader])
+        degrees._names()
+        print(f"{args.loader} load with name index: "
+              f"{time.perf_counter() - start:.3f}s")
+
+    rng = random.Random(0)
+    people = [person for person, _ in random_pairs(args.queries)]
+    queries = {
+        "exact": [degrees.graph.name(person) for person in people],
+        "prefix": [degrees.graph.name(person)[:4] for person in people],
+        "suggest": [_misspell(degrees.graph.name(person), rng)
+                    for person in people],
+    }
+    lookups = {
+        "exact": degrees.name_index.exact,
+        "prefix": degrees.complete_name,
+        "suggest": lambda name: degrees.suggest_names(name, args.distance),
+    }
+    for kind, names in queries.items():
+        start = time.perf_counter()
+        results = [lookups[kind](name) for name in names]
+        elapsed = time.perf_counter() - start
+        hits = sum(1 for result in results if result)
+        print(f"{kind:>8}: {elapsed / len(names) * 1000:.3f} ms/query, "
+              f"{hits} of {len(names)} found")
+
+
+def _misspell(name, rng):
+    """
+    Return `name` with one random character replaced.
+    """
+    i = rng.randrange(len(name))
+    return name[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz") + name[i + 1:]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks for degrees.py.")
+    parser.add_argument("--directory",
+                        help="dataset to load instead of a synthetic one")
+    parser.add_argument("--people", type=int, default=5000)
+    parser.add_argument("--movies", type=int, default=1500)
+    parser.add_argument("--cast", type=int, default=8)
+    parser.add_argument("--compact", action="store_true",
+                        help="load an integer-indexed CompactGraph")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    search = subparsers.add_parser(
+        "search", help="compare search algorithms on random pairs")
+    search.add_argument("--queries", type=int, default=20)
+    search.add_argument("--searches", nargs="+",
+                        default=["bfs", "bidirectional"],
+                        choices=sorted(set(degrees.SEARCHES) - {"alt"}),
+                        help="searches to compare; alt needs a landmark "
+                             "index, so compare it with 'landmarks'")
+    search.set_defaults(run=bench_search)
+
+    frontier = subparsers.add_parser(
+        "frontier", help="time single frontier operations")
+    frontier.add_argument("--sizes", nargs="+", type=int,
+                          default=[10 ** 5, 10 ** 6])
+    frontier.add_argument("--ops", type=int, default=200)
+    frontier.set_defaults(run=bench_frontier)
+
+    load = subparsers.add_parser(
+        "load", help="compare CSV parsing with cold and warm snapshots")
+    load.set_defaults(run=bench_load)
+
+    batch = subparsers.add_parser(
+        "batch", help="compare single queries with batched queries")
+    batch.add_argument("--sources", type=int, default=10)
+    batch.add_argument("--targets", type=int, default=20,
+                       help="queries per source")
+    batch.set_defaults(run=bench_batch)
+
+    workers = subparsers.add_parser(
+        "workers", help="batch query throughput against number of workers")
+    workers.add_argument("--queries", type=int, default=400)
+    workers.add_argument("--workers", nargs="+", type=int,
+                         default=[1, 2, 4, 8])
+    workers.set_defaults(run=bench_workers)
+
+    alt = subparsers.add_parser(
+        "landmarks", help="landmark index build time and ALT queries")
+    alt.add_argument("--count", type=int, default=32)
+    alt.add_argument("--queries", type=int, default=50)
+    alt.add_argument("--searches", nargs="+",
+                     default=["bfs", "bidirectional", "alt"],
+                     choices=sorted(degrees.SEARCHES))
+    alt.set_defaults(run=bench_landmarks)
+
+    hubs = subparsers.add_parser(
+        "hubs", help="collapsed movie expansion on blockbuster casts")
+    hubs.add_argument("--queries", type=int, default=50)
+    hubs.add_argument("--blockbusters", type=int, default=50)
+    hubs.add_argument("--blockbuster-cast", type=int, default=400)
+    hubs.add_argument("--searches", nargs="+",
+                      default=["bfs", "bfs-collapsed", "bidirectional",
+                               "bidirectional-collapsed"],
+                      choices=sorted(degrees.SEARCHES))
+    hubs.set_defaults(run=bench_hubs)
+
+    memory = subparsers.add_parser(
+        "memory", help="peak RSS of each loader")
+    memory.set_defaults(run=bench_memory)
+
+    rss = subparsers.add_parser("rss")
+    rss.add_argument("loader", choices=sorted(LOADERS))
+    rss.set_defaults(run=bench_rss)
+
+    names = subparsers.add_parser(
+        "names", help="name index build time and query latency")
+    names.add_argument("--loader", choices=sorted(LOADERS),
+                       default="dictionaries")
+    names.add_argument("--queries", type=int, default=200)
+    names.add_argument("--distance", type=int, default=2,
+                       help="edit distance allowed for suggestions")
+    names.set_defaults(run=bench_names)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,15 @@
+import argparse
 import csv
+import heapq
+import json
+import multiprocessing
 import sys
+from functools import partial
 
-from util import Node, StackFrontier, QueueFrontier
+from graph import CompactGraph, DictGraph, cached_graph
+from landmarks import cached_index
+from nameindex import NameIndex
+from util import Node, DequeStackFrontier, DequeQueueFrontier
 
 # Maps names to a set of corresponding person_ids
 names = {}
@@ -12,30 +20,60 @@ people = {}
 # Maps movie_ids to a dictionary of: title, year, stars (a set of person_ids)
 movies = {}
 
+# Graph the searches run on: a DictGraph over `people` and `movies`,
+# or a CompactGraph when loaded with `compact=True`
+graph = None
 
-def load_data(directory):
+# LandmarkIndex used by `shortest_path_alt`, set by `load_landmarks`
+landmarks = None
+
+# NameIndex for name lookups, prefix completion and suggestions
+name_index = None
+
+
+def load_data(directory, compact=False, snapshot=False, lazy=False):
     """
     Load data from CSV files into memory.
+
+    With `compact`, build an integer-indexed CompactGraph instead of
+    the `people` and `movies` dictionaries. With `snapshot`, map that
+    graph from a binary snapshot next to the CSVs, writing the snapshot
+    first if it is missing or older than the CSVs. With `lazy`, stream
+    a CompactGraph from the CSVs keeping only ids and adjacency in
+    memory; names are read the first time a person is looked up.
+
+    Compact graphs are searched by name through `name_index` only;
+    the `names` dictionary is filled for the dictionary graph.
     """
+    global graph, name_index
+    if compact or snapshot or lazy:
+        if snapshot:
+            graph = cached_graph(directory)
+        else:
+            graph = CompactGraph.from_csv(directory, lazy=lazy)
+        name_index = None if lazy else NameIndex.for_graph(graph)
+        return
+
     # Load people
     with open(f"{directory}/people.csv", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         for row in reader:
-            people[row["id"]] = {
+            person_id = sys.intern(row["id"])
+            people[person_id] = {
                 "name": row["name"],
                 "birth": row["birth"],
                 "movies": set()
             }
             if row["name"].lower() not in names:
-                names[row["name"].lower()] = {row["id"]}
+                names[row["name"].lower()] = {person_id}
             else:
-                names[row["name"].lower()].add(row["id"])
+                names[row["name"].lower()].add(person_id)
 
     # Load movies
     with open(f"{directory}/movies.csv", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         for row in reader:
-            movies[row["id"]] = {
+            movies[sys.intern(row["id"])] = {
                 "title": row["title"],
                 "year": row["year"],
                 "stars": set()
@@ -45,21 +83,104 @@ def load_data(directory):
     with open(f"{directory}/stars.csv", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         for row in reader:
+            person_id = sys.intern(row["person_id"])
+            movie_id = sys.intern(row["movie_id"])
             try:
-                people[row["person_id"]]["movies"].add(row["movie_id"])
-                movies[row["movie_id"]]["stars"].add(row["person_id"])
+                people[person_id]["movies"].add(movie_id)
+                movies[movie_id]["stars"].add(person_id)
             except KeyError:
                 pass
 
+    graph = DictGraph(people, movies)
+    name_index = NameIndex.from_names(
+        (person["name"], person_id) for person_id, person in people.items())
+
+
+def _names():
+    """
+    Returns the NameIndex, building it on first use after a lazy load.
+    """
+    global name_index
+    if name_index is None:
+        name_index = NameIndex.for_graph(graph)
+    return name_index
+
+
+def complete_name(prefix, limit=10):
+    """
+    Returns up to `limit` (name, person_id) pairs for the people whose
+    name starts with `prefix`, ignoring case.
+    """
+    return _names().prefix(prefix, limit)
+
+
+def suggest_names(name, max_distance=2, limit=10):
+    """
+    Returns up to `limit` (name, person_id, distance) triples for the
+    people whose name is within `max_distance` edits of `name`.
+    Takes milliseconds on millions of names; see NameIndex.
+    """
+    return _names().suggest(name, max_distance, limit)
+
+
+def load_landmarks(directory, count=32):
+    """
+    Load the landmark index for the compact graph loaded from
+    `directory`, building it first if it is missing or out of date.
+    """
+    global landmarks
+    landmarks = cached_index(graph, directory, count)
+
 
 def main():
-    if len(sys.argv) > 2:
-        sys.exit("Usage: python degrees.py [directory]")
-    directory = sys.argv[1] if len(sys.argv) == 2 else "large"
+    parser = argparse.ArgumentParser(
+        description="Find the degrees of separation between two actors.")
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("--search", choices=sorted(SEARCHES), default="bfs",
+                        help="search algorithm used to find the path")
+    parser.add_argument("--compact", action="store_true",
+                        help="load the data into an integer-indexed graph")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="like --compact, cached in a binary snapshot")
+    parser.add_argument("--lazy", action="store_true",
+                        help="like --compact, reading names only when needed")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="answer 'source,target' person id pairs "
+                             "from FILE ('-' for stdin) as JSON lines")
+    parser.add_argument("--distances", metavar="PERSON_ID",
+                        help="print the degrees from PERSON_ID "
+                             "to everyone connected as JSON lines")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes answering --batch queries")
+    parser.add_argument("--landmarks", type=int, default=32,
+                        help="landmarks in the index --search alt uses; "
+                             "match the --count given to landmarks.py")
+    args = parser.parse_args()
+    search = SEARCHES[args.search]
+
+    # Landmarks index the integer states of a compact graph
+    if args.search == "alt" and not (args.snapshot or args.lazy):
+        args.compact = True
+
+    # Batch modes write JSON lines only, with no prompts
+    if args.batch or args.distances:
+        load_data(args.directory, compact=args.compact,
+                  snapshot=args.snapshot, lazy=args.lazy)
+        if args.distances:
+            write_distances(args.distances, sys.stdout)
+        elif args.batch == "-":
+            write_batch(sys.stdin, sys.stdout, args.workers)
+        else:
+            with open(args.batch, encoding="utf-8") as f:
+                write_batch(f, sys.stdout, args.workers)
+        return
 
     # Load data from files into memory
     print("Loading data...")
-    load_data(directory)
+    load_data(args.directory, compact=args.compact, snapshot=args.snapshot,
+              lazy=args.lazy)
+    if args.search == "alt":
+        load_landmarks(args.directory, args.landmarks)
     print("Data loaded.")
 
     source = person_id_for_name(input("Name: "))
@@ -69,7 +190,7 @@ def main():
     if target is None:
         sys.exit("Person not found.")
 
-    path = shortest_path(source, target)
+    path = search(source, target)
 
     if path is None:
         print("Not connected.")
@@ -78,56 +199,402 @@ def main():
         print(f"{degrees} degrees of separation.")
         path = [(None, source)] + path
         for i in range(degrees):
-            person1 = people[path[i][1]]["name"]
-            person2 = people[path[i + 1][1]]["name"]
-            movie = movies[path[i + 1][0]]["title"]
+            person1 = graph.name(path[i][1])
+            person2 = graph.name(path[i + 1][1])
+            movie = graph.title(path[i + 1][0])
             print(f"{i + 1}: {person1} and {person2} starred in {movie}")
 
 
-def shortest_path(source, target):
+def shortest_path(source, target, collapse_movies=False):
     """
     Returns the shortest list of (movie_id, person_id) pairs
     that connect the source to the target.
 
     If no possible path, returns None.
+
+    With `collapse_movies`, movies are marked explored as well as
+    people, so each cast list is walked at most once per search.
+    The path found is the same: once a movie's cast has been walked,
+    every one of its stars is already explored or in the frontier.
     """
     if source == target:
         return []
+    source, target = graph.index(source), graph.index(target)
 
-    frontier, explored = QueueFrontier(), set()
+    frontier, explored = DequeQueueFrontier(), set()
     frontier.add(Node(source, None, None))
+    explored_movies = set()
 
     while not frontier.empty():
         node = frontier.remove()
         explored.add(node.state)
-        
-        for movie in people[node.state]["movies"]:
-            for person in movies[movie]["stars"]:
+
+        for movie in graph.movies_of(node.state):
+            if collapse_movies:
+                if movie in explored_movies:
+                    continue
+                explored_movies.add(movie)
+            for person in graph.stars_of(movie):
                 if person == target:
                     path = [(movie, person)]
                     while node.parent != None:
                         path.append((node.action, node.state))
                         node = node.parent
                     path.reverse()
-                    return path
+                    return _external(path)
                 if person not in explored and not frontier.contains_state(person):
                     frontier.add(Node(person, node, movie))
     return None
 
+
+def shortest_path_bidirectional(source, target, collapse_movies=False):
+    """
+    Returns a shortest path of the same length as `shortest_path`
+    (not necessarily the same path), but searches from the source and
+    the target at once, one whole level at a time, and stops as soon as
+    the two searches meet.
+
+    The side with the smaller frontier is always expanded next, so the
+    number of people explored grows with roughly the square root of
+    what a one-sided search would need.
+
+    `collapse_movies` works as in `shortest_path`, with each side
+    keeping its own set of walked movies.
+    """
+    if source == target:
+        return []
+    source, target = graph.index(source), graph.index(target)
+
+    # Map each reached person to (previous person, movie linking them).
+    # Forward entries point back towards the source,
+    # backward entries point on towards the target.
+    forward, backward = {source: None}, {target: None}
+    forward_frontier, backward_frontier = [source], [target]
+    forward_movies, backward_movies = set(), set()
+
+    while forward_frontier and backward_frontier:
+        if len(forward_frontier) <= len(backward_frontier):
+            frontier, reached, other = forward_frontier, forward, backward
+            walked = forward_movies
+        else:
+            frontier, reached, other = backward_frontier, backward, forward
+            walked = backward_movies
+
+        # Expand a whole level and keep the best meeting point in it
+        next_frontier, meeting = [], None
+        for person in frontier:
+            for movie in graph.movies_of(person):
+                if collapse_movies:
+                    if movie in walked:
+                        continue
+                    walked.add(movie)
+                for neighbor in graph.stars_of(movie):
+                    if neighbor in reached:
+                        continue
+                    reached[neighbor] = (person, movie)
+                    next_frontier.append(neighbor)
+                    if neighbor in other and (
+                            meeting is None or
+                            _depth(other, neighbor) < _depth(other, meeting)):
+                        meeting = neighbor
+
+        if meeting is not None:
+            return _join_paths(forward, backward, meeting)
+
+        if reached is forward:
+            forward_frontier = next_frontier
+        else:
+            backward_frontier = next_frontier
+
+    return None
+
+
+def shortest_path_alt(source, target):
+    """
+    Returns a shortest path of the same length as `shortest_path`
+    (not necessarily the same path), found with A* search guided by
+    landmark lower bounds (the ALT algorithm).
+
+    People whose bound shows they cannot beat the best path so far
+    are never expanded, and people the landmarks prove cannot reach
+    the target are never queued. Needs `load_landmarks`.
+    """
+    if landmarks is None:
+        raise Exception("no landmark index loaded")
+    if source == target:
+        return []
+    source, target = graph.index(source), graph.index(target)
+
+    lower_bound = landmarks.heuristic(target, source)
+    if lower_bound(source) == float("inf"):
+        return None
+
+    # Queue entries are (estimated length, -distance, person); among
+    # equal estimates the deepest person is expanded first
+    distances, parents = {source: 0}, {source: None}
+    queue = [(lower_bound(source), 0, source)]
+    while queue:
+        _, distance, person = heapq.heappop(queue)
+        distance = -distance
+        if person == target:
+            return _tree_path(parents, person)
+        if distance > distances[person]:
+            continue
+        for movie in graph.movies_of(person):
+            for neighbor in graph.stars_of(movie):
+                if distance + 1 >= distances.get(neighbor, float("inf")):
+                    continue
+                estimate = lower_bound(neighbor)
+                if estimate == float("inf"):
+                    continue
+                distances[neighbor] = distance + 1
+                parents[neighbor] = (person, movie)
+                heapq.heappush(
+                    queue, (distance + 1 + estimate, -distance - 1, neighbor))
+    return None
+
+
+def distance_bounds(source, target):
+    """
+    Returns (lower, upper) bounds on the degrees of separation between
+    two person_ids from the landmark index, without searching.
+    """
+    if landmarks is None:
+        raise Exception("no landmark index loaded")
+    return landmarks.bounds(graph.index(source), graph.index(target))
+
+
+def _depth(reached, person):
+    """
+    Returns the number of steps from `person` back to the root
+    of the search that reached it.
+    """
+    depth = 0
+    while reached[person] is not None:
+        person = reached[person][0]
+        depth += 1
+    return depth
+
+
+def _join_paths(forward, backward, meeting):
+    """
+    Joins the forward and backward search trees at `meeting`
+    into a list of (movie_id, person_id) pairs from source to target.
+    """
+    path = []
+    person = meeting
+    while forward[person] is not None:
+        previous, movie = forward[person]
+        path.append((movie, person))
+        person = previous
+    path.reverse()
+
+    person = meeting
+    while backward[person] is not None:
+        following, movie = backward[person]
+        path.append((movie, following))
+        person = following
+    return _external(path)
+
+
+def _external(path):
+    """
+    Converts a path of graph states into (movie_id, person_id) pairs.
+    """
+    return [
+        (graph.movie_id(movie), graph.person_id(person))
+        for movie, person in path
+    ]
+
+
+def shortest_paths(source, targets):
+    """
+    Returns a dict mapping each person_id in `targets` to the shortest
+    path from `source` to it, as `shortest_path` would return it.
+
+    All the paths come from a single breadth-first search tree,
+    which stops growing once every target has been reached.
+    """
+    source = graph.index(source)
+    states = {target: graph.index(target) for target in targets}
+    parents = _bfs_tree(source, set(states.values()))
+    return {
+        target: _tree_path(parents, state) if state in parents else None
+        for target, state in states.items()
+    }
+
+
+def distances_from(source):
+    """
+    Returns a dict mapping the person_id of everyone connected to
+    `source` to their degrees of separation from `source`.
+    """
+    source = graph.index(source)
+    distances = {source: 0}
+    frontier, depth = [source], 0
+    while frontier:
+        depth += 1
+        next_frontier = []
+        for person in frontier:
+            for movie in graph.movies_of(person):
+                for neighbor in graph.stars_of(movie):
+                    if neighbor not in distances:
+                        distances[neighbor] = depth
+                        next_frontier.append(neighbor)
+        frontier = next_frontier
+    return {
+        graph.person_id(person): distance
+        for person, distance in distances.items()
+    }
+
+
+def batch_paths(pairs, workers=1):
+    """
+    Yields (source, target, path) for every (source, target) pair of
+    person_ids, in order, where path is as returned by `shortest_path`.
+
+    Pairs that share a source are answered from one search tree.
+    A pair naming an unknown person gets a KeyError instead of a path.
+
+    With more than one worker, the sources are spread over a pool of
+    forked processes. The children share the loaded graph with this
+    process copy-on-write instead of loading or receiving their own.
+    """
+    pairs = list(pairs)
+    by_source = {}
+    for source, target in pairs:
+        by_source.setdefault(source, set()).add(target)
+
+    paths = {}
+    if workers > 1:
+        context = multiprocessing.get_context("fork")
+        chunksize = max(1, len(by_source) // (workers * 8))
+        with context.Pool(workers) as pool:
+            for source, found in pool.imap_unordered(
+                    _answer_source, by_source.items(), chunksize):
+                for target, path in found.items():
+                    paths[source, target] = path
+    else:
+        for source, found in map(_answer_source, by_source.items()):
+            for target, path in found.items():
+                paths[source, target] = path
+
+    for source, target in pairs:
+        yield source, target, paths[source, target]
+
+
+def _answer_source(query):
+    """
+    Answers a (source, targets) query for `batch_paths`, returning
+    (source, paths) with a KeyError in place of paths to unknown people.
+    """
+    source, targets = query
+    try:
+        return source, shortest_paths(source, targets)
+    except KeyError:
+        # Answer what can be answered, one pair at a time
+        found = {}
+        for target in targets:
+            try:
+                found.update(shortest_paths(source, [target]))
+            except KeyError as e:
+                found[target] = e
+        return source, found
+
+
+def write_batch(lines, output, workers=1):
+    """
+    Reads 'source,target' person_id pairs from `lines` and writes one
+    JSON object per pair to `output`, with the path as a list of
+    [movie_id, person_id] pairs, or null if they are not connected.
+    """
+    pairs = [
+        (row[0].strip(), row[1].strip())
+        for row in csv.reader(lines)
+        if len(row) >= 2 and row[:2] != ["source", "target"]
+    ]
+    for source, target, path in batch_paths(pairs, workers):
+        result = {"source": source, "target": target}
+        if isinstance(path, KeyError):
+            result["error"] = f"unknown person {path.args[0]}"
+        else:
+            result["degrees"] = None if path is None else len(path)
+            result["path"] = path
+        output.write(json.dumps(result) + "\n")
+
+
+def write_distances(source, output):
+    """
+    Writes the degrees of separation from `source` to everyone
+    connected to them as one JSON object per person to `output`, or a
+    single error object, as `write_batch` does, if `source` is unknown.
+    """
+    try:
+        distances = distances_from(source)
+    except KeyError as e:
+        output.write(json.dumps(
+            {"source": source, "error": f"unknown person {e.args[0]}"}))
+        output.write("\n")
+        return
+    for person_id, distance in distances.items():
+        output.write(json.dumps({"person": person_id, "degrees": distance}))
+        output.write("\n")
+
+
+def _bfs_tree(source, targets):
+    """
+    Runs a breadth-first search from the graph state `source` until
+    every state in `targets` is reached (or nothing more can be), and
+    returns a dict mapping each reached state to (parent, movie),
+    or None for the source itself.
+    """
+    parents = {source: None}
+    remaining = set(targets) - {source}
+    frontier = [source]
+    while frontier and remaining:
+        next_frontier = []
+        for person in frontier:
+            for movie in graph.movies_of(person):
+                for neighbor in graph.stars_of(movie):
+                    if neighbor not in parents:
+                        parents[neighbor] = (person, movie)
+                        next_frontier.append(neighbor)
+                        remaining.discard(neighbor)
+        frontier = next_frontier
+    return parents
+
+
+def _tree_path(parents, person):
+    """
+    Returns the (movie_id, person_id) path from the root of a search
+    tree built by `_bfs_tree` to `person`.
+    """
+    path = []
+    while parents[person] is not None:
+        parent, movie = parents[person]
+        path.append((movie, person))
+        person = parent
+    path.reverse()
+    return _external(path)
+
+
 def person_id_for_name(name):
     """
     Returns the IMDB id for a person's name,
     resolving ambiguities as needed.
     """
-    person_ids = list(names.get(name.lower(), set()))
+    person_ids = list(_names().exact(name))
     if len(person_ids) == 0:
+        suggestions = suggest_names(name, limit=5)
+        if suggestions:
+            print("Did you mean: " + ", ".join(
+                graph.name(person_id) for _, person_id, _ in suggestions))
         return None
     elif len(person_ids) > 1:
         print(f"Which '{name}'?")
         for person_id in person_ids:
-            person = people[person_id]
-            name = person["name"]
-            birth = person["birth"]
+            name = graph.name(person_id)
+            birth = graph.birth(person_id)
             print(f"ID: {person_id}, Name: {name}, Birth: {birth}")
         try:
             person_id = input("Intended Person ID: ")
@@ -145,13 +612,24 @@ def neighbors_for_person(person_id):
     Returns (movie_id, person_id) pairs for people
     who starred with a given person.
     """
-    movie_ids = people[person_id]["movies"]
     neighbors = set()
-    for movie_id in movie_ids:
-        for person_id in movies[movie_id]["stars"]:
-            neighbors.add((movie_id, person_id))
+    for movie in graph.movies_of(graph.index(person_id)):
+        movie_id = graph.movie_id(movie)
+        for person in graph.stars_of(movie):
+            neighbors.add((movie_id, graph.person_id(person)))
     return neighbors
 
 
+# Search algorithms selectable with `--search`
+SEARCHES = {
+    "bfs": shortest_path,
+    "bidirectional": shortest_path_bidirectional,
+    "alt": shortest_path_alt,
+    "bfs-collapsed": partial(shortest_path, collapse_movies=True),
+    "bidirectional-collapsed": partial(
+        shortest_path_bidirectional, collapse_movies=True),
+}
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,437 @@
+import csv
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+# Snapshot files start with this magic string and format version
+SNAPSHOT_MAGIC = b"DEGSNAP\0"
+SNAPSHOT_VERSION = 2
+SNAPSHOT_FILE = "graph.snapshot"
+
+
+class DictGraph():
+    """
+    Graph view over the `people` and `movies` dictionaries built by
+    `degrees.load_data`.
+
+    Search code works on "states": opaque person and movie handles
+    returned by `index`, `movies_of` and `stars_of`. Here the states are
+    simply the IMDb ids themselves.
+    """
+
+    def __init__(self, people, movies):
+        self.people = people
+        self.movies = movies
+
+    def __len__(self):
+        return len(self.people)
+
+    def states(self):
+        return iter(self.people)
+
+    def index(self, person_id):
+        if person_id not in self.people:
+            raise KeyError(person_id)
+        return person_id
+
+    def person_id(self, person):
+        return person
+
+    def movie_id(self, movie):
+        return movie
+
+    def movies_of(self, person):
+        return self.people[person]["movies"]
+
+    def stars_of(self, movie):
+        return self.movies[movie]["stars"]
+
+    def name(self, person_id):
+        return self.people[person_id]["name"]
+
+    def birth(self, person_id):
+        return self.people[person_id]["birth"]
+
+    def title(self, movie_id):
+        return self.movies[movie_id]["title"]
+
+
+class CompactGraph():
+    """
+    Co-star graph with dense integer states.
+
+    People and movies are numbered 0..n-1 in file order. The person ->
+    movies and movie -> stars adjacency lists are stored in CSR form:
+    the neighbours of person `p` are
+    `person_movies[person_start[p]:person_start[p + 1]]`,
+    and likewise for movies. Both are flat `array`s of machine integers,
+    so the whole graph costs a few bytes per edge instead of a Python
+    set entry per edge.
+
+    Ids are found with a binary search over `person_order` and
+    `movie_order`, the states sorted by id, so a graph mapped from a
+    snapshot needs no dictionaries built before it can answer queries.
+    Snapshots also keep `name_order`, the people sorted by lowercased
+    name, for the NameIndex.
+    """
+
+    def __init__(self, person_ids, names, births, movie_ids, titles,
+                 person_start, person_movies, movie_start, movie_stars,
+                 person_order=None, movie_order=None, name_order=None):
+        self.person_ids = person_ids
+        self.names = names
+        self.births = births
+        self.movie_ids = movie_ids
+        self.titles = titles
+        self.person_start = person_start
+        self.person_movies = memoryview(person_movies)
+        self.movie_start = movie_start
+        self.movie_stars = memoryview(movie_stars)
+        if person_order is None:
+            person_order = _sorted_order(person_ids)
+        if movie_order is None:
+            movie_order = _sorted_order(movie_ids)
+        self.person_order = person_order
+        self.movie_order = movie_order
+        self.name_order = name_order
+
+    @classmethod
+    def from_csv(cls, directory, lazy=False):
+        """
+        Build a graph from the people.csv, movies.csv and stars.csv
+        files in `directory`.
+
+        With `lazy`, the CSVs are streamed for ids only: ids are kept in
+        StringTables, and names, births and titles stay on disk in
+        LazyColumns until one of them is first looked up.
+        """
+        people_file = f"{directory}/people.csv"
+        movies_file = f"{directory}/movies.csv"
+        if lazy:
+            person_ids = StringTable.from_strings(_column(people_file, "id"))
+            movie_ids = StringTable.from_strings(_column(movies_file, "id"))
+            names = LazyColumn(people_file, "name")
+            births = LazyColumn(people_file, "birth")
+            titles = LazyColumn(movies_file, "title")
+        else:
+            person_ids, names, births = _read_columns(
+                people_file, ("id", "name", "birth"))
+            movie_ids, titles = _read_columns(movies_file, ("id", "title"))
+        person_index = {
+            sys.intern(person_id): i for i, person_id in enumerate(person_ids)
+        }
+        movie_index = {
+            sys.intern(movie_id): i for i, movie_id in enumerate(movie_ids)
+        }
+
+        # Collect edges as two parallel integer arrays
+        edge_people, edge_movies = array("i"), array("i")
+        with open(f"{directory}/stars.csv", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            person_column = header.index("person_id")
+            movie_column = header.index("movie_id")
+            for row in reader:
+                person = person_index.get(row[person_column])
+                movie = movie_index.get(row[movie_column])
+                if person is None or movie is None:
+                    continue
+                edge_people.append(person)
+                edge_movies.append(movie)
+
+        del person_index, movie_index
+
+        person_start, person_movies = _csr(
+            len(person_ids), edge_people, edge_movies)
+        movie_start, movie_stars = _csr(
+            len(movie_ids), edge_movies, edge_people)
+        return cls(person_ids, names, births, movie_ids, titles,
+                   person_start, person_movies, movie_start, movie_stars)
+
+    def __len__(self):
+        return len(self.person_ids)
+
+    def states(self):
+        return iter(range(len(self.person_ids)))
+
+    def index(self, person_id):
+        return _lookup(self.person_order, self.person_ids, person_id)
+
+    def person_id(self, person):
+        return self.person_ids[person]
+
+    def movie_id(self, movie):
+        return self.movie_ids[movie]
+
+    def movies_of(self, person):
+        start = self.person_start
+        return self.person_movies[start[person]:start[person + 1]]
+
+    def stars_of(self, movie):
+        start = self.movie_start
+        return self.movie_stars[start[movie]:start[movie + 1]]
+
+    def name(self, person_id):
+        return self.names[self.index(person_id)]
+
+    def birth(self, person_id):
+        return self.births[self.index(person_id)]
+
+    def title(self, movie_id):
+        return self.titles[_lookup(self.movie_order, self.movie_ids, movie_id)]
+
+    def save(self, filename, key=""):
+        """
+        Write the graph to a snapshot file that `load` can map back.
+
+        `key` identifies the data the graph was built from; `load`
+        rejects the snapshot if it is given a different key.
+        """
+        sections = {
+            "person_start": self.person_start,
+            "person_movies": self.person_movies,
+            "movie_start": self.movie_start,
+            "movie_stars": self.movie_stars,
+            "person_order": self.person_order,
+            "movie_order": self.movie_order,
+            "name_order": self.name_order,
+        }
+        if self.name_order is None:
+            sections["name_order"] = array("i", sorted(
+                range(len(self.names)),
+                key=lambda person: self.names[person].lower()))
+        for column in ("person_ids", "names", "births", "movie_ids", "titles"):
+            table = StringTable.from_strings(getattr(self, column))
+            sections[f"{column}.offsets"] = table.offsets
+            sections[f"{column}.data"] = table.data
+
+        # Lay sections out one after another, each 8-byte aligned
+        layout, offset = {}, 0
+        for name, values in sections.items():
+            values = memoryview(values)
+            layout[name] = [values.format, offset, len(values)]
+            offset += -(-values.nbytes // 8) * 8
+        header = json.dumps({
+            "version": SNAPSHOT_VERSION,
+            "key": key,
+            "sections": layout,
+        }).encode()
+        header += b" " * (-len(header) % 8)
+
+        temporary = f"{filename}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(struct.pack("<Q", len(header)))
+            f.write(header)
+            for values in sections.values():
+                data = memoryview(values).cast("B")
+                f.write(data)
+                f.write(b"\0" * (-len(data) % 8))
+        os.replace(temporary, filename)
+
+    @classmethod
+    def load(cls, filename, key=None):
+        """
+        Map a snapshot written by `save` into memory.
+
+        Returns None if the file is missing, was written by another
+        version of this code, or (when `key` is given) was built from
+        different data.
+        """
+        try:
+            with open(filename, "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        view = memoryview(buffer)
+        start = len(SNAPSHOT_MAGIC) + 8
+        if len(view) < start or view[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            return None
+        header_length, = struct.unpack_from("<Q", view, len(SNAPSHOT_MAGIC))
+        header = json.loads(bytes(view[start:start + header_length]))
+        if header["version"] != SNAPSHOT_VERSION:
+            return None
+        if key is not None and header["key"] != key:
+            return None
+
+        base = start + header_length
+        sections = {}
+        for name, (typecode, offset, count) in header["sections"].items():
+            size = struct.calcsize(typecode)
+            offset += base
+            sections[name] = view[offset:offset + count * size].cast(typecode)
+
+        def strings(column):
+            return StringTable(
+                sections[f"{column}.offsets"], sections[f"{column}.data"])
+
+        return cls(
+            strings("person_ids"), strings("names"), strings("births"),
+            strings("movie_ids"), strings("titles"),
+            sections["person_start"], sections["person_movies"],
+            sections["movie_start"], sections["movie_stars"],
+            person_order=sections["person_order"],
+            movie_order=sections["movie_order"],
+            name_order=sections["name_order"],
+        )
+
+
+class StringTable():
+    """
+    Read-only sequence of strings stored as one UTF-8 buffer plus an
+    array of offsets; string `i` is data[offsets[i]:offsets[i + 1]].
+    """
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    @classmethod
+    def from_strings(cls, strings):
+        if isinstance(strings, cls):
+            return strings
+        offsets, data = array("q", [0]), bytearray()
+        for string in strings:
+            data += string.encode("utf-8")
+            offsets.append(len(data))
+        return cls(offsets, data)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        return str(self.data[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class LazyColumn():
+    """
+    Read-only sequence of one column of a CSV file, left on disk until
+    it is first indexed and then held as a StringTable.
+    """
+
+    def __init__(self, filename, column):
+        self.filename = filename
+        self.column = column
+        self.values = None
+
+    def load(self):
+        if self.values is None:
+            self.values = StringTable.from_strings(
+                _column(self.filename, self.column))
+        return self.values
+
+    def __len__(self):
+        return len(self.load())
+
+    def __getitem__(self, i):
+        return self.load()[i]
+
+    def __iter__(self):
+        return iter(self.load())
+
+
+def cached_graph(directory):
+    """
+    Return the CompactGraph for the CSVs in `directory`, mapped from
+    its snapshot file when one exists for the current CSVs.
+
+    Otherwise build it from the CSVs and write a new snapshot, so the
+    next call can skip parsing.
+    """
+    filename = os.path.join(directory, SNAPSHOT_FILE)
+    key = csv_key(directory)
+    graph = CompactGraph.load(filename, key)
+    if graph is None:
+        graph = CompactGraph.from_csv(directory)
+        try:
+            graph.save(filename, key)
+        except OSError:
+            pass
+    return graph
+
+
+def csv_key(directory):
+    """
+    Return a key that changes whenever one of the CSVs in `directory`
+    is modified, built from their sizes and modification times.
+    """
+    digest = hashlib.sha256()
+    for filename in ("people.csv", "movies.csv", "stars.csv"):
+        stat = os.stat(os.path.join(directory, filename))
+        digest.update(f"{filename}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+
+def _column(filename, column):
+    """
+    Yield the values of one column of a CSV file, row by row.
+    """
+    with open(filename, encoding="utf-8") as f:
+        reader = csv.reader(f)
+        index = next(reader).index(column)
+        for row in reader:
+            yield row[index]
+
+
+def _read_columns(filename, columns):
+    """
+    Read the given columns of a CSV file into one list per column.
+    """
+    with open(filename, encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        indices = [header.index(column) for column in columns]
+        lists = tuple([] for _ in columns)
+        for row in reader:
+            for values, i in zip(lists, indices):
+                values.append(row[i])
+    return lists
+
+
+def _sorted_order(ids):
+    """
+    Return the indices of `ids` sorted by id, for use with `_lookup`.
+    """
+    return array("i", sorted(range(len(ids)), key=ids.__getitem__))
+
+
+def _lookup(order, ids, value):
+    """
+    Return the index of `value` in `ids` by binary search over `order`,
+    raising KeyError if it is not there.
+    """
+    i = bisect_left(order, value, key=ids.__getitem__)
+    if i < len(order) and ids[order[i]] == value:
+        return order[i]
+    raise KeyError(value)
+
+
+def _csr(n, rows, cols):
+    """
+    Group the edges (rows[i], cols[i]) by row with a counting sort.
+    Return (start, targets) such that the targets of row `r` are
+    targets[start[r]:start[r + 1]].
+    """
+    start = array("q", [0]) * (n + 1)
+    for row in rows:
+        start[row + 1] += 1
+    for i in range(n):
+        start[i + 1] += start[i]
+
+    targets = array("i", [0]) * len(rows)
+    position = array("q", start)
+    for row, col in zip(rows, cols):
+        targets[position[row]] = col
+        position[row] += 1
+    return start, targets
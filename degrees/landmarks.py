@@ -0,0 +1,212 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+from array import array
+
+from graph import CompactGraph, cached_graph, csv_key
+
+# Index files start with this magic string and format version
+INDEX_MAGIC = b"DEGLMK\0\0"
+INDEX_VERSION = 1
+INDEX_FILE = "landmarks.index"
+
+# Distance stored for people a landmark cannot reach
+UNREACHABLE = 255
+
+
+class LandmarkIndex():
+    """
+    Breadth-first distances from a few well-connected "landmark" people
+    to everyone in a CompactGraph.
+
+    By the triangle inequality, |d(L, s) - d(L, t)| <= d(s, t) <=
+    d(L, s) + d(L, t) for every landmark L, which bounds the degrees of
+    separation of any pair without searching. The lower bound is also
+    an admissible, consistent A* heuristic.
+
+    `distances[i]` holds one byte per person for landmark `landmarks[i]`.
+    """
+
+    def __init__(self, landmarks, distances):
+        self.landmarks = landmarks
+        self.distances = distances
+
+    @classmethod
+    def build(cls, graph, count=32):
+        """
+        Index the `count` people who appear in the most movies.
+        """
+        if not isinstance(graph, CompactGraph):
+            raise Exception("landmark index needs a CompactGraph")
+        start = graph.person_start
+        by_degree = sorted(
+            graph.states(),
+            key=lambda person: start[person + 1] - start[person],
+            reverse=True)
+        landmarks = by_degree[:count]
+        distances = [_distances(graph, landmark) for landmark in landmarks]
+        return cls(landmarks, distances)
+
+    def bounds(self, source, target):
+        """
+        Return (lower, upper) bounds on the degrees of separation
+        between the graph states `source` and `target`. Both are
+        infinite if some landmark proves they are not connected;
+        upper is infinite if no landmark reaches both.
+        """
+        lower, upper = 0, float("inf")
+        for distances in self.distances:
+            s, t = distances[source], distances[target]
+            if s == UNREACHABLE and t == UNREACHABLE:
+                continue
+            if s == UNREACHABLE or t == UNREACHABLE:
+                return float("inf"), float("inf")
+            lower = max(lower, abs(s - t))
+            upper = min(upper, s + t)
+        return lower, upper
+
+    def heuristic(self, target, source=None, active=4):
+        """
+        Return a function giving a lower bound on the distance from
+        any state to `target`, or infinity if it cannot reach `target`.
+
+        Only the `active` landmarks giving the best bound for `source`
+        are consulted, which keeps each call cheap.
+        """
+        tables = [
+            (distances, distances[target]) for distances in self.distances
+        ]
+        if source is not None:
+            tables.sort(
+                key=lambda table: _bound(table[0][source], table[1]),
+                reverse=True)
+        tables = tables[:active]
+
+        def lower_bound(person):
+            best = 0
+            for distances, to_target in tables:
+                bound = _bound(distances[person], to_target)
+                if bound > best:
+                    best = bound
+            return best
+        return lower_bound
+
+    def save(self, filename, key=""):
+        """
+        Write the index to `filename`; `load` rejects it for another key.
+        """
+        header = json.dumps({
+            "version": INDEX_VERSION,
+            "key": key,
+            "landmarks": list(self.landmarks),
+        }).encode()
+        temporary = f"{filename}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(INDEX_MAGIC)
+            f.write(struct.pack("<Q", len(header)))
+            f.write(header)
+            for distances in self.distances:
+                f.write(distances)
+        os.replace(temporary, filename)
+
+    @classmethod
+    def load(cls, filename, key=None):
+        """
+        Map an index written by `save`, or return None if it is
+        missing, from another version, or built for another key.
+        """
+        try:
+            with open(filename, "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        view = memoryview(buffer)
+        start = len(INDEX_MAGIC) + 8
+        if len(view) < start or view[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+            return None
+        header_length, = struct.unpack_from("<Q", view, len(INDEX_MAGIC))
+        header = json.loads(bytes(view[start:start + header_length]))
+        if header["version"] != INDEX_VERSION:
+            return None
+        if key is not None and header["key"] != key:
+            return None
+
+        landmarks = header["landmarks"]
+        offset = start + header_length
+        size = (len(view) - offset) // max(1, len(landmarks))
+        distances = [
+            view[offset + i * size:offset + (i + 1) * size]
+            for i in range(len(landmarks))
+        ]
+        return cls(landmarks, distances)
+
+
+def cached_index(graph, directory, count=32):
+    """
+    Return the landmark index for the CSVs in `directory`, loading
+    it from its index file if that matches the current CSVs, and
+    building and saving it otherwise.
+    """
+    filename = os.path.join(directory, INDEX_FILE)
+    key = f"{csv_key(directory)}:{count}"
+    index = LandmarkIndex.load(filename, key)
+    if index is None:
+        index = LandmarkIndex.build(graph, count)
+        try:
+            index.save(filename, key)
+        except OSError:
+            pass
+    return index
+
+
+def _bound(from_landmark, to_target):
+    """
+    Lower bound from one landmark's distances to a state and the target.
+    """
+    if from_landmark == UNREACHABLE or to_target == UNREACHABLE:
+        return 0 if from_landmark == to_target else float("inf")
+    return abs(from_landmark - to_target)
+
+
+def _distances(graph, source):
+    """
+    Return a byte array of breadth-first distances from `source`.
+    """
+    distances = array("B", [UNREACHABLE]) * len(graph)
+    distances[source] = 0
+    frontier, depth = [source], 0
+    while frontier:
+        depth += 1
+        next_frontier = []
+        for person in frontier:
+            for movie in graph.movies_of(person):
+                for neighbor in graph.stars_of(movie):
+                    if distances[neighbor] == UNREACHABLE:
+                        if depth == UNREACHABLE:
+                            raise Exception(
+                                "graph too deep for a landmark index")
+                        distances[neighbor] = depth
+                        next_frontier.append(neighbor)
+        frontier = next_frontier
+    return distances
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build the landmark index used by --search alt.")
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("--count", type=int, default=32,
+                        help="number of landmarks")
+    args = parser.parse_args()
+
+    graph = cached_graph(args.directory)
+    index = cached_index(graph, args.directory, args.count)
+    print(f"Indexed {len(index.landmarks)} landmarks "
+          f"for {len(graph)} people.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,6 @@
+from collections import deque
+
+
 class Node():
     def __init__(self, state, parent, action):
         self.state = state
@@ -36,3 +39,54 @@ class QueueFrontier(StackFrontier):
             node = self.frontier[0]
             self.frontier = self.frontier[1:]
             return node
+
+
+class DequeStackFrontier():
+    """
+    Same interface as `StackFrontier`, but backed by a deque with a
+    set of states alongside it, so `add`, `remove` and `contains_state`
+    all take constant time.
+
+    A state stays "contained" while at least one node for it is in
+    the frontier.
+    """
+
+    def __init__(self):
+        self.frontier = deque()
+        self.states = {}
+
+    def add(self, node):
+        self.frontier.append(node)
+        self.states[node.state] = self.states.get(node.state, 0) + 1
+
+    def contains_state(self, state):
+        return state in self.states
+
+    def empty(self):
+        return len(self.frontier) == 0
+
+    def remove(self):
+        if self.empty():
+            raise Exception("empty frontier")
+        else:
+            node = self.frontier.pop()
+            self._forget(node)
+            return node
+
+    def _forget(self, node):
+        count = self.states[node.state]
+        if count == 1:
+            del self.states[node.state]
+        else:
+            self.states[node.state] = count - 1
+
+
+class DequeQueueFrontier(DequeStackFrontier):
+
+    def remove(self):
+        if self.empty():
+            raise Exception("empty frontier")
+        else:
+            node = self.frontier.popleft()
+            self._forget(node)
+            return node
@@ -0,0 +1,292 @@
+import argparse
+import cProfile
+import os
+import pstats
+import random
+import time
+
+import numpy as np
+
+import heredity
+from vectorized import Family, Tables, joint_probabilities
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def generate_family(n, observed=0.5, inbreeding=0.05, seed=0):
+    """
+    Return a random family of `n` people in the format of `load_data`.
+
+    Each child has one parent from the family and, usually, one who
+    married in as a founder; with probability `inbreeding` both come
+    from the family, which closes loops in the tree. A fraction
+    `observed` of people have a known trait.
+    """
+    rng = random.Random(seed)
+    people = dict()
+
+    def add(mother=None, father=None):
+        name = f"person{len(people)}"
+        people[name] = {
+            "name": name,
+            "mother": mother,
+            "father": father,
+            "trait": (rng.random() < 0.1 if rng.random() < observed
+                      else None),
+        }
+        return name
+
+    add()
+    while len(people) < n:
+        parent = rng.choice(list(people))
+        if rng.random() < inbreeding and len(people) > 2:
+            partner = rng.choice([p for p in people if p != parent])
+        elif len(people) + 2 <= n:
+            partner = add()
+        else:
+            partner = rng.choice([p for p in people if p != parent])
+        add(parent, partner)
+    return people
+
+
+def max_difference(expected, actual):
+    """
+    Return the largest difference between two `probabilities` tables.
+    """
+    return max(
+        abs(expected[person][field][value] - actual[person][field][value])
+        for person in expected
+        for field in expected[person]
+        for value in expected[person][field]
+    )
+
+
+def timed(method, people):
+    """
+    Return (probabilities, seconds) for one of heredity.METHODS.
+    """
+    start = time.perf_counter()
+    probabilities = heredity.METHODS[method](people)
+    return probabilities, time.perf_counter() - start
+
+
+def bundled_families():
+    """
+    Return (name, people) for each family in the data directory.
+    """
+    return [
+        (name, heredity.load_data(os.path.join(DATA, f"{name}.csv")))
+        for name in ("family0", "family1", "family2")
+    ]
+
+
+def compare(name, people, method):
+    """
+    Print how long `method` and enumeration take on `people`, and how
+    far apart their results are.
+    """
+    expected, enumerated = timed("enumerate", people)
+    actual, seconds = timed(method, people)
+    print(f"{name} ({len(people)} people): "
+          f"enumerate {enumerated:8.4f}s, "
+          f"{method} {seconds:8.4f}s "
+          f"(max difference {max_difference(expected, actual):.1e})")
+
+
+def bench_elimination(args):
+    """
+    Time variable elimination against enumeration on the bundled
+    families and small generated ones, then elimination alone on
+    generated families too large to enumerate.
+    """
+    families = bundled_families() + [
+        (f"generated {n}", generate_family(n, inbreeding=args.inbreeding,
+                                           seed=n))
+        for n in args.enumerate_sizes
+    ]
+    for name, people in families:
+        compare(name, people, "elimination")
+
+    for n in args.sizes:
+        people = generate_family(n, inbreeding=args.inbreeding, seed=n)
+        _, eliminated = timed("elimination", people)
+        print(f"generated {n} ({len(people)} people): "
+              f"elimination {eliminated:8.4f}s")
+
+
+def bench_pruned(args):
+    """
+    Time pruned enumeration against full enumeration on the bundled
+    families and on generated ones with more and more known traits.
+    """
+    for name, people in bundled_families():
+        compare(name, people, "pruned")
+    for observed in args.observed:
+        people = generate_family(args.people, observed, seed=args.people)
+        known = sum(person["trait"] is not None for person in people.values())
+        compare(f"generated, {known} traits known", people, "pruned")
+
+
+def bench_vectorized(args):
+    """
+    Check the vectorized joint probabilities against `joint_probability`
+    on random assignments, then time vectorized against scalar
+    enumeration.
+    """
+    families = bundled_families() + [
+        (f"generated {n}", generate_family(n, seed=n)) for n in args.sizes
+    ]
+    rng = np.random.default_rng(0)
+    tables = Tables(heredity.GENE, heredity.INHERITANCE, heredity.TRAIT)
+    for name, people in families:
+        family = Family(people)
+        genes = rng.integers(0, 3, (args.checks, len(family)))
+        traits = rng.integers(0, 2, (args.checks, len(family)))
+        batched = joint_probabilities(tables, family, genes, traits)
+        scalar = np.array([
+            heredity.joint_probability(
+                people,
+                {family.names[i] for i in np.flatnonzero(row == 1)},
+                {family.names[i] for i in np.flatnonzero(row == 2)},
+                {family.names[i] for i in np.flatnonzero(have)})
+            for row, have in zip(genes, traits)
+        ])
+        error = np.max(np.abs(batched - scalar) / scalar)
+        if error > 1e-12:
+            raise Exception(f"{name}: joint probabilities differ by {error}")
+        compare(name, people, "vectorized")
+        print(f"  {args.checks} joint probabilities agree to {error:.1e} "
+              "(relative)")
+
+
+def bench_parallel(args):
+    """
+    Time parallel enumeration with growing numbers of workers on a
+    generated family, against the single-process enumeration.
+    """
+    people = generate_family(args.people, seed=args.people)
+    expected, enumerated = timed("enumerate", people)
+    print(f"generated {args.people} ({len(people)} people): "
+          f"enumerate {enumerated:8.3f}s")
+    for workers in args.workers:
+        start = time.perf_counter()
+        actual = heredity.parallel_probabilities(people, workers)
+        seconds = time.perf_counter() - start
+        print(f"  {workers:>2} workers: {seconds:8.3f}s "
+              f"(speedup {enumerated / seconds:5.2f}, "
+              f"max difference {max_difference(expected, actual):.1e})")
+
+
+def recomputed_joint_probability(people, one_gene, two_genes, have_trait):
+    """
+    `joint_probability` as it was before the lookup tables, calling
+    `genes_from_parents` and indexing PROBS for every person.
+    """
+    def n_copies(person):
+        return 2 if person in two_genes else 1 if person in one_gene else 0
+
+    joint = 1
+    for person in people:
+        g = n_copies(person)
+        if not people[person]["mother"]:
+            joint *= heredity.PROBS["gene"][g]
+        else:
+            joint *= heredity.genes_from_parents(
+                g, n_copies(people[person]["mother"]),
+                n_copies(people[person]["father"]))
+        joint *= heredity.PROBS["trait"][g][person in have_trait]
+    return joint
+
+
+def bench_tables(args):
+    """
+    Profile `joint_probability` with its lookup tables against the same
+    computation without them, over every gene assignment of a family.
+    """
+    people = generate_family(args.people, seed=args.people)
+    have_trait = {
+        person for person in people if people[person]["trait"]
+    }
+    assignments = list(heredity.gene_assignments(people))
+    print(f"generated {args.people} ({len(people)} people), "
+          f"{len(assignments)} assignments")
+
+    results = dict()
+    for function in (recomputed_joint_probability,
+                     heredity.joint_probability):
+        start = time.perf_counter()
+        results[function] = [
+            function(people, one_gene, two_genes, have_trait)
+            for one_gene, two_genes in assignments
+        ]
+        seconds = time.perf_counter() - start
+
+        profile = cProfile.Profile()
+        profile.runcall(lambda: [
+            function(people, one_gene, two_genes, have_trait)
+            for one_gene, two_genes in assignments
+        ])
+        stats = pstats.Stats(profile).stats
+        calls = {key[2]: stats[key][1] for key in stats}
+        profiled = next(
+            stats[key][3] for key in stats if key[2] == function.__name__)
+        helpers = (calls.get("genes_from_parents", 0) +
+                   calls.get("gets_gene", 0))
+        print(f"  {function.__name__:>28}: "
+              f"{seconds / len(assignments) * 1e6:6.2f}us per assignment "
+              f"({profiled / len(assignments) * 1e6:6.2f}us profiled), "
+              f"{helpers / len(assignments):5.1f} helper calls each")
+
+    difference = max(
+        abs(a - b) for a, b in zip(*results.values()))
+    print(f"  max difference {difference:.1e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks for heredity.py.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    elimination = subparsers.add_parser(
+        "elimination", help="variable elimination against enumeration")
+    elimination.add_argument("--enumerate-sizes", nargs="+", type=int,
+                             default=[6, 8])
+    elimination.add_argument("--sizes", nargs="+", type=int,
+                             default=[50, 200, 500, 1000])
+    elimination.add_argument("--inbreeding", type=float, default=0.01,
+                             help="chance a child's parents are both "
+                                  "from the family")
+    elimination.set_defaults(run=bench_elimination)
+
+    pruned = subparsers.add_parser(
+        "pruned", help="pruned enumeration against full enumeration")
+    pruned.add_argument("--people", type=int, default=8)
+    pruned.add_argument("--observed", nargs="+", type=float,
+                        default=[0, 0.5, 1])
+    pruned.set_defaults(run=bench_pruned)
+
+    vectorized = subparsers.add_parser(
+        "vectorized", help="NumPy batches against scalar enumeration")
+    vectorized.add_argument("--sizes", nargs="+", type=int, default=[7, 8])
+    vectorized.add_argument("--checks", type=int, default=10000,
+                            help="random assignments to compare")
+    vectorized.set_defaults(run=bench_vectorized)
+
+    parallel = subparsers.add_parser(
+        "parallel", help="scaling of parallel sharded enumeration")
+    parallel.add_argument("--people", type=int, default=8)
+    parallel.add_argument("--workers", nargs="+", type=int,
+                          default=[1, 2, 4, 8])
+    parallel.set_defaults(run=bench_parallel)
+
+    tables = subparsers.add_parser(
+        "tables", help="profile joint_probability with lookup tables")
+    tables.add_argument("--people", type=int, default=8)
+    tables.set_defaults(run=bench_tables)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
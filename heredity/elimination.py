@@ -0,0 +1,184 @@
+import itertools
+
+# Copies of the gene a person can have, in the order factors store them
+GENES = (0, 1, 2)
+
+
+class Factor():
+    """
+    Nonnegative table over the gene counts of `variables`, a tuple of
+    people. `values` lists one entry per assignment of GENES to the
+    variables, in row-major order (the last variable changes fastest).
+    """
+
+    def __init__(self, variables, values):
+        self.variables = variables
+        self.values = values
+
+    def multiply(self, other):
+        """
+        Return the product of two factors, over the union of their variables.
+        """
+        variables = self.variables + tuple(
+            variable for variable in other.variables
+            if variable not in self.variables)
+        return Factor(variables, [
+            self.values[i] * other.values[j]
+            for i, j in zip(_project(variables, self.variables),
+                            _project(variables, other.variables))
+        ])
+
+    def marginal(self, variables):
+        """
+        Return the factor summed over every variable not in `variables`.
+        """
+        values = [0.0] * len(GENES) ** len(variables)
+        for i, value in zip(_project(self.variables, variables), self.values):
+            values[i] += value
+        return Factor(tuple(variables), values)
+
+    def normalized(self):
+        """
+        Return the factor scaled to sum to 1. Messages are rescaled as
+        they are passed so that large families do not underflow.
+        """
+        total = sum(self.values)
+        return Factor(self.variables, [value / total for value in self.values])
+
+
+def infer(people, gene, inheritance, trait):
+    """
+    Return the `probabilities` dictionary heredity.main prints, for
+    `people` as returned by `load_data` and heredity's GENE,
+    INHERITANCE and TRAIT lookup tables, computed exactly by variable
+    elimination.
+
+    Each person contributes one factor: their gene prior, or the chance
+    of their gene count given their parents', times the chance of their
+    trait if it is known. Eliminating people one at a time builds a
+    tree of cliques; passing messages up and then down it gives every
+    person's marginal at once. The cost grows with the number of people
+    times 3 to the power of the largest clique, which family trees keep
+    small, rather than with 2^n * 3^n as enumeration does.
+    """
+    factors = [
+        _family_factor(people, person, gene, inheritance, trait)
+        for person in people
+    ]
+    beliefs = _calibrate(factors, _elimination_order(factors))
+
+    probabilities = dict()
+    for person in people:
+        genes = beliefs[person].marginal((person,)).normalized().values
+        known = people[person]["trait"]
+        if known is None:
+            has_trait = sum(genes[g] * trait[g][True] for g in GENES)
+        else:
+            has_trait = float(known)
+        probabilities[person] = {
+            "gene": {g: genes[g] for g in reversed(GENES)},
+            "trait": {True: has_trait, False: 1 - has_trait},
+        }
+    return probabilities
+
+
+def _family_factor(people, person, gene, inheritance, trait):
+    """
+    Return the factor over `person` and their parents for the person's
+    gene count and, where it is known, their trait.
+    """
+    known = people[person]["trait"]
+    evidence = [1.0 if known is None else trait[g][known] for g in GENES]
+    mother, father = people[person]["mother"], people[person]["father"]
+    if not mother:
+        return Factor((person,), [gene[g] * evidence[g] for g in GENES])
+
+    return Factor((mother, father, person), [
+        inheritance[g][m][f] * evidence[g]
+        for m, f, g in itertools.product(GENES, GENES, GENES)
+    ])
+
+
+def _elimination_order(factors):
+    """
+    Return an order to eliminate the factors' variables in, greedily
+    taking the one with the fewest neighbours left each time.
+    """
+    neighbors = dict()
+    for factor in factors:
+        for variable in factor.variables:
+            neighbors.setdefault(variable, set()).update(factor.variables)
+            neighbors[variable].discard(variable)
+
+    order = []
+    while neighbors:
+        variable = min(neighbors, key=lambda v: len(neighbors[v]))
+        for neighbor in neighbors[variable]:
+            neighbors[neighbor] |= neighbors[variable] - {neighbor}
+            neighbors[neighbor].discard(variable)
+        del neighbors[variable]
+        order.append(variable)
+    return order
+
+
+def _calibrate(factors, order):
+    """
+    Return, for each variable, a factor over the clique made when it was
+    eliminated, proportional to the joint distribution of that clique.
+
+    Each factor goes in the bucket of its first variable in `order`.
+    Eliminating a variable sums its bucket's product down to a message
+    for the bucket of the next variable it mentions, which makes the
+    buckets a tree. A second pass back down the tree gives each bucket
+    the messages from the rest of the tree.
+    """
+    position = {variable: i for i, variable in enumerate(order)}
+    buckets = {variable: Factor((variable,), [1.0] * len(GENES))
+               for variable in order}
+    for factor in factors:
+        first = min(factor.variables, key=position.get)
+        buckets[first] = buckets[first].multiply(factor)
+
+    # Up: each bucket's message to its parent
+    children = {variable: [] for variable in order}
+    parent, up = dict(), dict()
+    for variable in order:
+        clique = buckets[variable]
+        for child in children[variable]:
+            clique = clique.multiply(up[child])
+        separator = tuple(v for v in clique.variables if v != variable)
+        up[variable] = clique.marginal(separator).normalized()
+        parent[variable] = min(separator, key=position.get, default=None)
+        if parent[variable] is not None:
+            children[parent[variable]].append(variable)
+
+    # Down: each parent's message to its children
+    down, beliefs = dict(), dict()
+    for variable in reversed(order):
+        messages = [up[child] for child in children[variable]]
+        if parent[variable] is not None:
+            messages.append(down[variable])
+        for i, child in enumerate(children[variable]):
+            clique = buckets[variable]
+            for j, message in enumerate(messages):
+                if j != i:
+                    clique = clique.multiply(message)
+            down[child] = clique.marginal(up[child].variables).normalized()
+        belief = buckets[variable]
+        for message in messages:
+            belief = belief.multiply(message)
+        beliefs[variable] = belief
+    return beliefs
+
+
+def _project(variables, scope):
+    """
+    Return, for each assignment of GENES to `variables` in row-major
+    order, the index of its restriction to `scope`.
+    """
+    positions = [variables.index(variable) for variable in scope]
+    return [
+        sum(assignment[p] * len(GENES) ** (len(positions) - 1 - k)
+            for k, p in enumerate(positions))
+        for assignment in itertools.product(GENES, repeat=len(variables))
+    ]
@@ -1,6 +1,11 @@
+import argparse
 import csv
 import itertools
-import sys
+import multiprocessing
+import os
+
+from elimination import infer
+from vectorized import Tables, vectorized_probabilities
 
 PROBS = {
 
@@ -38,39 +43,46 @@ PROBS = {
 
 
 def main():
+    parser = argparse.ArgumentParser(
+        description="Infer gene and trait probabilities for a family.")
+    parser.add_argument("data", help="CSV of name, mother, father, trait")
+    parser.add_argument("--method", choices=sorted(METHODS) + ["parallel"],
+                        default="enumerate",
+                        help="how to compute the probabilities")
+    parser.add_argument("--workers", type=int,
+                        help="processes for the parallel enumeration")
+    args = parser.parse_args()
+    people = load_data(args.data)
+    if args.method == "parallel":
+        probabilities = parallel_probabilities(people, args.workers)
+    else:
+        probabilities = METHODS[args.method](people)
+
+    # Print results
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                print(f"    {value}: {p:.4f}")
 
-    # Check for proper usage
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python heredity.py data.csv")
-    people = load_data(sys.argv[1])
+
+def enumerate_probabilities(people):
+    """
+    Return the gene and trait distribution of each person, by summing
+    the joint probability of every assignment consistent with the data.
+    """
 
     # Keep track of gene and trait probabilities for each person
-    probabilities = {
-        person: {
-            "gene": {
-                2: 0,
-                1: 0,
-                0: 0
-            },
-            "trait": {
-                True: 0,
-                False: 0
-            }
-        }
-        for person in people
-    }
+    probabilities = empty_probabilities(people)
 
     # Loop over all sets of people who might have the trait
     names = set(people)
     for have_trait in powerset(names):
 
         # Check if current set of people violates known information
-        fails_evidence = any(
-            (people[person]["trait"] is not None and
-             people[person]["trait"] != (person in have_trait))
-            for person in names
-        )
-        if fails_evidence:
+        if fails_evidence(people, have_trait):
             continue
 
         # Loop over all sets of people who might have the gene
@@ -83,15 +95,126 @@ def main():
 
     # Ensure probabilities sum to 1
     normalize(probabilities)
+    return probabilities
 
-    # Print results
-    for person in people:
-        print(f"{person}:")
-        for field in probabilities[person]:
-            print(f"  {field.capitalize()}:")
-            for value in probabilities[person][field]:
-                p = probabilities[person][field][value]
-                print(f"    {value}: {p:.4f}")
+
+# People and shard lists for the enumeration workers, shared by fork
+_shared_shards = None
+
+
+def parallel_probabilities(people, workers=None):
+    """
+    Return the same distributions as `enumerate_probabilities`, with
+    the enumeration spread over a pool of `workers` processes.
+
+    The (have_trait, one_gene) pairs of the two outer loops are shards.
+    Each task sums a run of consecutive shards into a partial table of
+    unnormalized probabilities, and the partial tables are added up
+    before normalizing.
+    """
+    global _shared_shards
+    workers = workers or os.cpu_count() or 1
+    names = set(people)
+    have_traits = [
+        have_trait for have_trait in powerset(names)
+        if not fails_evidence(people, have_trait)
+    ]
+    one_genes = powerset(names)
+    shards = len(have_traits) * len(one_genes)
+    size = -(-shards // (workers * 4))
+    tasks = [(start, min(shards, start + size))
+             for start in range(0, shards, size)]
+
+    _shared_shards = people, have_traits, one_genes
+    context = multiprocessing.get_context("fork")
+    pool = context.Pool(workers) if workers > 1 else None
+    try:
+        partials = (pool.imap_unordered(_enumerate_shards, tasks) if pool
+                    else map(_enumerate_shards, tasks))
+        probabilities = empty_probabilities(people)
+        for partial in partials:
+            for person in partial:
+                for field in partial[person]:
+                    for value, p in partial[person][field].items():
+                        probabilities[person][field][value] += p
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        _shared_shards = None
+
+    normalize(probabilities)
+    return probabilities
+
+
+def _enumerate_shards(task):
+    """
+    Return the unnormalized probabilities summed over shards start..stop-1
+    of `parallel_probabilities`.
+    """
+    start, stop = task
+    people, have_traits, one_genes = _shared_shards
+    names = set(people)
+    probabilities = empty_probabilities(people)
+    for shard in range(start, stop):
+        have_trait = have_traits[shard // len(one_genes)]
+        one_gene = one_genes[shard % len(one_genes)]
+        for two_genes in powerset(names - one_gene):
+            p = joint_probability(people, one_gene, two_genes, have_trait)
+            update(probabilities, one_gene, two_genes, have_trait, p)
+    return probabilities
+
+
+def pruned_probabilities(people):
+    """
+    Return the same distributions as `enumerate_probabilities`, without
+    enumerating traits: known traits are fixed, and each unknown trait
+    is summed out exactly given the person's gene count. Gene
+    assignments are generated one at a time rather than built as lists.
+    """
+    probabilities = empty_probabilities(people)
+    for one_gene, two_genes in gene_assignments(people):
+        p = evidence_probability(people, one_gene, two_genes)
+        update_marginals(probabilities, people, one_gene, two_genes, p)
+    normalize(probabilities)
+    return probabilities
+
+
+def eliminate_probabilities(people):
+    """
+    Return the same distributions as `enumerate_probabilities`, computed
+    by variable elimination over the family tree.
+    """
+    return infer(people, GENE, INHERITANCE, TRAIT)
+
+
+def vectorize_probabilities(people):
+    """
+    Return the same distributions as `enumerate_probabilities`, with
+    joint probabilities computed in NumPy batches.
+    """
+    return vectorized_probabilities(
+        people, Tables(GENE, INHERITANCE, TRAIT))
+
+
+def empty_probabilities(people):
+    """
+    Return a table of zero gene and trait probabilities for each person.
+    """
+    return {
+        person: {
+            "gene": {
+                2: 0,
+                1: 0,
+                0: 0
+            },
+            "trait": {
+                True: 0,
+                False: 0
+            }
+        }
+        for person in people
+    }
 
 
 def load_data(filename):
@@ -116,6 +239,17 @@ def load_data(filename):
     return data
 
 
+def fails_evidence(people, have_trait):
+    """
+    Return whether `have_trait` contradicts a known trait.
+    """
+    return any(
+        (people[person]["trait"] is not None and
+         people[person]["trait"] != (person in have_trait))
+        for person in people
+    )
+
+
 def powerset(s):
     """
     Return a list of all possible subsets of set s.
@@ -127,6 +261,19 @@ def powerset(s):
         )
     ]
 
+def gene_assignments(people):
+    """
+    Yield (one_gene, two_genes) for every way of giving each person
+    0, 1 or 2 copies of the gene, one assignment at a time.
+    """
+    names = list(people)
+    for copies in itertools.product((0, 1, 2), repeat=len(names)):
+        yield (
+            {name for name, n in zip(names, copies) if n == 1},
+            {name for name, n in zip(names, copies) if n == 2},
+        )
+
+
 def gets_gene(parent, gets):
     	if parent == 1:
     		return 0.5
@@ -144,6 +291,24 @@ def genes_from_parents(person, mother, father):
 	else:
 		return gets_gene(mother, False) * gets_gene(father, False)
 
+
+# Lookup tables built once from PROBS: GENE[g] for people without
+# parents, INHERITANCE[g][m][f] = genes_from_parents(g, m, f), and
+# TRAIT[g][t] for trait t (False or True) given g copies. Every method
+# reads the model from these, so they cannot drift apart.
+GENE = tuple(PROBS["gene"][g] for g in range(3))
+INHERITANCE = tuple(
+    tuple(
+        tuple(genes_from_parents(g, m, f) for f in range(3))
+        for m in range(3)
+    )
+    for g in range(3)
+)
+TRAIT = tuple(
+    (PROBS["trait"][g][False], PROBS["trait"][g][True]) for g in range(3)
+)
+
+
 def joint_probability(people, one_gene, two_genes, have_trait):
     """
     Compute and return a joint probability.
@@ -162,16 +327,54 @@ def joint_probability(people, one_gene, two_genes, have_trait):
     for person in people:
     	g = n_copies(person)
     	if not people[person]["mother"]:
-    		joint *= PROBS["gene"][g] 
-    		joint *= PROBS["trait"][g][person in have_trait]
+    		joint *= GENE[g]
     	else:
     		mg = n_copies(people[person]["mother"])
     		fg = n_copies(people[person]["father"])
-    		joint *= genes_from_parents(g, mg, fg) 
-    		joint *= PROBS["trait"][g][person in have_trait]
+    		joint *= INHERITANCE[g][mg][fg]
+    	joint *= TRAIT[g][person in have_trait]
+
+    return joint
+
+def evidence_probability(people, one_gene, two_genes):
+    """
+    Return the probability that everyone has the genes given by
+    `one_gene` and `two_genes` and everyone with a known trait has it:
+    `joint_probability` summed over every unknown trait.
+    """
+    def n_copies(person):
+        return 2 if person in two_genes else 1 if person in one_gene else 0
 
+    joint = 1
+    for person in people:
+        g = n_copies(person)
+        if not people[person]["mother"]:
+            joint *= GENE[g]
+        else:
+            joint *= INHERITANCE[g][n_copies(people[person]["mother"])][
+                n_copies(people[person]["father"])]
+        if people[person]["trait"] is not None:
+            joint *= TRAIT[g][people[person]["trait"]]
     return joint
 
+
+def update_marginals(probabilities, people, one_gene, two_genes, p):
+    """
+    Add to `probabilities` the probability `p` of a gene assignment
+    and the known traits. Unknown traits get their share of `p` given
+    the person's gene count, as the trait enumeration would give them.
+    """
+    for person in probabilities:
+        g = 2 if person in two_genes else 1 if person in one_gene else 0
+        probabilities[person]["gene"][g] += p
+        trait = people[person]["trait"]
+        if trait is not None:
+            probabilities[person]["trait"][trait] += p
+        else:
+            probabilities[person]["trait"][True] += p * TRAIT[g][True]
+            probabilities[person]["trait"][False] += p * TRAIT[g][False]
+
+
 def update(probabilities, one_gene, two_genes, have_trait, p):
     """
     Add to `probabilities` a new joint probability `p`.
@@ -196,5 +399,15 @@ def normalize(probabilities):
    			for key in probabilities[person][dct]:
    				probabilities[person][dct][key] *= k
 
+
+# Ways of computing the probabilities selectable with `--method`
+METHODS = {
+    "enumerate": enumerate_probabilities,
+    "elimination": eliminate_probabilities,
+    "pruned": pruned_probabilities,
+    "vectorized": vectorize_probabilities,
+}
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,115 @@
+import numpy as np
+
+# Assignments evaluated together in one batch of NumPy operations
+BATCH_SIZE = 2 ** 14
+
+
+class Tables():
+    """
+    heredity's GENE, INHERITANCE and TRAIT lookup tables as NumPy
+    arrays: `gene[g]` is the chance a person without parents in the
+    data has g copies of the gene, `inheritance[g, m, f]` the chance a
+    child of parents with m and f copies has g copies, and
+    `trait[g, t]` the chance of trait t (0 or 1) given g copies.
+    """
+
+    def __init__(self, gene, inheritance, trait):
+        self.gene = np.array(gene)
+        self.inheritance = np.array(inheritance)
+        self.trait = np.array(trait)
+
+
+class Family():
+    """
+    `people` as integer arrays: `founders` and `children` index the
+    people without and with parents, `mothers` and `fathers` the
+    parents of each child, and `traits` holds 0, 1, or -1 when unknown.
+    """
+
+    def __init__(self, people):
+        self.names = list(people)
+        index = {name: i for i, name in enumerate(self.names)}
+        has_parents = [bool(people[name]["mother"]) for name in self.names]
+        self.founders = np.array(
+            [i for i, parents in enumerate(has_parents) if not parents],
+            dtype=np.intp)
+        self.children = np.array(
+            [i for i, parents in enumerate(has_parents) if parents],
+            dtype=np.intp)
+        self.mothers = np.array(
+            [index[people[self.names[i]]["mother"]] for i in self.children],
+            dtype=np.intp)
+        self.fathers = np.array(
+            [index[people[self.names[i]]["father"]] for i in self.children],
+            dtype=np.intp)
+        self.traits = np.array([
+            -1 if people[name]["trait"] is None else int(people[name]["trait"])
+            for name in self.names
+        ])
+
+    def __len__(self):
+        return len(self.names)
+
+
+def joint_probabilities(tables, family, genes, traits):
+    """
+    Return the `joint_probability` of each row of `genes` and `traits`,
+    (assignments, people) arrays of gene counts and traits (0 or 1)
+    in the order of `family.names`.
+    """
+    rows = np.arange(len(genes))[:, None]
+    factors = tables.trait[genes, traits]
+    factors[:, family.founders] *= tables.gene[genes[:, family.founders]]
+    factors[:, family.children] *= tables.inheritance[
+        genes[:, family.children],
+        genes[rows, family.mothers],
+        genes[rows, family.fathers]]
+    return factors.prod(axis=1)
+
+
+def assignments(family, start, stop):
+    """
+    Return (genes, traits) arrays for assignments start..stop-1 of all
+    those consistent with the known traits. Assignment i is numbered
+    with one base-3 digit per person's gene count, then one bit per
+    unknown trait.
+    """
+    number = np.arange(start, stop, dtype=np.int64)[:, None]
+    n = len(family)
+    genes = (number // 3 ** np.arange(n, dtype=np.int64)) % 3
+    unknown = np.flatnonzero(family.traits < 0)
+    traits = np.broadcast_to(family.traits, (len(number), n)).copy()
+    traits[:, unknown] = (
+        number // 3 ** n >> np.arange(len(unknown), dtype=np.int64)) & 1
+    return genes, traits
+
+
+def vectorized_probabilities(people, tables, batch_size=BATCH_SIZE):
+    """
+    Return the same distributions as enumeration, given `tables` as
+    Tables, evaluating `batch_size` assignments at a time with NumPy
+    and adding them into per-person totals with np.add.at.
+    """
+    family = Family(people)
+    n = len(family)
+    gene_totals = np.zeros((n, 3))
+    trait_totals = np.zeros((n, 2))
+    people_index = np.arange(n)[None, :]
+    total = 3 ** n * 2 ** int(np.sum(family.traits < 0))
+    for start in range(0, total, batch_size):
+        genes, traits = assignments(
+            family, start, min(total, start + batch_size))
+        p = joint_probabilities(tables, family, genes, traits)[:, None]
+        np.add.at(gene_totals, (people_index, genes), p)
+        np.add.at(trait_totals, (people_index, traits), p)
+
+    gene_totals /= gene_totals.sum(axis=1, keepdims=True)
+    trait_totals /= trait_totals.sum(axis=1, keepdims=True)
+    return {
+        name: {
+            "gene": {g: float(gene_totals[i, g]) for g in (2, 1, 0)},
+            "trait": {True: float(trait_totals[i, 1]),
+                      False: float(trait_totals[i, 0])},
+        }
+        for i, name in enumerate(family.names)
+    }
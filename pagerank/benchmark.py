@@ -0,0 +1,575 @@
+import argparse
+import os
+import random
+import resource
+import tempfile
+import time
+
+import numpy as np
+
+import pagerank
+from crawler import crawl_parallel
+from incremental import incremental_pagerank
+from linkgraph import GraphWriter, LinkGraph
+from outofcore import BLOCK_LINKS, out_of_core_pagerank
+from sampling import parallel_sample, sample_visits
+from solvers import SOLVERS, block_power_iteration, power_iteration
+
+
+def synthetic_graph(n, degree=10, dangling=0.05, seed=0):
+    """
+    Return a random LinkGraph of `n` pages with about `degree` links
+    per page. Link targets are skewed towards low page numbers, so
+    some pages are far more popular than others, and a `dangling`
+    fraction of pages has no links at all.
+    """
+    rng = np.random.default_rng(seed)
+    counts = rng.poisson(degree, n)
+    counts[rng.random(n) < dangling] = 0
+    sources = np.repeat(np.arange(n, dtype=np.int64), counts)
+    targets = (n * rng.random(len(sources)) ** 2).astype(np.int64)
+    pages = [f"{i}.html" for i in range(n)]
+    return LinkGraph.from_edges(pages, sources, targets)
+
+
+def local_graph(n, degree=10, window=20, seed=0):
+    """
+    Return a random LinkGraph of `n` pages in a ring, each linking to
+    about `degree` of the next `window` pages. Rank diffuses slowly
+    around the ring, so power iteration needs many more steps than on
+    `synthetic_graph`.
+    """
+    rng = np.random.default_rng(seed)
+    sources = np.repeat(np.arange(n, dtype=np.int64), rng.poisson(degree, n))
+    targets = (sources + rng.integers(1, window, len(sources))) % n
+    pages = [f"{i}.html" for i in range(n)]
+    return LinkGraph.from_edges(pages, sources, targets)
+
+
+def write_synthetic_graph(filename, n, degree=10, dangling=0.05, seed=0,
+                          block_pages=2 ** 20, block_links=BLOCK_LINKS):
+    """
+    Write a random graph shaped like `synthetic_graph` straight to the
+    graph file `filename`, `block_pages` pages at a time, so that it
+    can be far larger than memory. Return the number of links.
+
+    Each block's links are drawn twice from the same seed: first to
+    write them in source order and count the links into every page,
+    then to spread them over temporary files holding about
+    `block_links` links each, by target. Each of those is sorted in
+    memory to give the incoming links.
+    """
+    index_type = np.int32 if n < 2 ** 31 else np.int64
+    starts = range(0, n, block_pages)
+
+    def block(lo):
+        rng = np.random.default_rng([seed, lo])
+        hi = min(n, lo + block_pages)
+        counts = rng.poisson(degree, hi - lo)
+        counts[rng.random(hi - lo) < dangling] = 0
+        sources = np.repeat(np.arange(lo, hi, dtype=np.int64), counts)
+        targets = (n * rng.random(len(sources)) ** 2).astype(np.int64)
+        keep = sources != targets
+        keys = np.sort(sources[keep] * n + targets[keep])
+        unique = np.empty(len(keys), dtype=bool)
+        unique[:1] = True
+        np.not_equal(keys[1:], keys[:-1], out=unique[1:])
+        keys = keys[unique]
+        return keys // n, keys % n
+
+    with GraphWriter(filename) as writer:
+        out_start = np.zeros(n + 1, dtype=np.int64)
+        in_start = np.zeros(n + 1, dtype=np.int64)
+        for lo in starts:
+            sources, targets = block(lo)
+            writer.write("out_targets", targets.astype(index_type))
+            out_start[lo + 1:lo + block_pages + 1] = np.bincount(
+                sources - lo, minlength=min(block_pages, n - lo))
+            in_start[1:] += np.bincount(targets, minlength=n)
+        np.cumsum(out_start, out=out_start)
+        np.cumsum(in_start, out=in_start)
+        writer.write("out_start", out_start)
+        writer.write("in_start", in_start)
+        links = int(in_start[-1])
+        del out_start
+
+        bounds = np.unique(np.append(
+            np.searchsorted(in_start, np.arange(0, links, block_links)),
+            [0, n]))
+        del in_start
+        with tempfile.TemporaryDirectory(
+                dir=os.path.dirname(os.path.abspath(filename))) as directory:
+            names = [os.path.join(directory, f"{i}.links")
+                     for i in range(len(bounds) - 1)]
+            buckets = [open(name, "wb") for name in names]
+            for lo in starts:
+                sources, targets = block(lo)
+                bucket = np.searchsorted(bounds, targets, side="right") - 1
+                order = np.argsort(bucket, kind="stable")
+                ends = np.cumsum(np.bincount(bucket, minlength=len(buckets)))
+                pairs = np.column_stack((targets, sources))[order]
+                for i, (begin, end) in enumerate(zip(
+                        np.append(0, ends[:-1]), ends)):
+                    pairs[begin:end].astype(index_type).tofile(buckets[i])
+            for f in buckets:
+                f.close()
+
+            for name in names:
+                pairs = np.fromfile(name, dtype=index_type).reshape(-1, 2)
+                os.remove(name)
+                order = np.argsort(pairs[:, 0], kind="stable")
+                writer.write("in_sources", pairs[order, 1])
+
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        for lo in starts:
+            names = np.char.add(
+                np.arange(lo, min(n, lo + block_pages)).astype(str), ".html")
+            offsets[lo + 1:lo + len(names) + 1] = (
+                offsets[lo] + np.cumsum(np.char.str_len(names)))
+            writer.write("pages.data", np.frombuffer(
+                "".join(names.tolist()).encode(), dtype=np.uint8))
+        writer.write("pages.offsets", offsets)
+    return links
+
+
+def to_corpus(graph):
+    """
+    Return `graph` as a `crawl` dictionary of page -> set of pages.
+    """
+    return {
+        page: {
+            graph.pages[target] for target in
+            graph.out_targets[graph.out_start[i]:graph.out_start[i + 1]]
+        }
+        for i, page in enumerate(graph.pages)
+    }
+
+
+def bench_sparse(args):
+    """
+    Time the sparse power-iteration engine on growing synthetic graphs,
+    and the original pure Python iteration where it is still feasible.
+    """
+    for n in args.sizes:
+        graph = synthetic_graph(n, args.degree)
+        start = time.perf_counter()
+        ranks = power_iteration(graph, pagerank.DAMPING, pagerank.ACCURACY)
+        sparse = time.perf_counter() - start
+        line = (f"{n:>9} pages {graph.edges:>10} links: "
+                f"sparse {sparse:8.3f}s")
+
+        if n <= args.python_limit:
+            corpus = to_corpus(graph)
+            start = time.perf_counter()
+            expected = pagerank.iterate_pagerank(corpus, pagerank.DAMPING)
+            python = time.perf_counter() - start
+            difference = max(
+                abs(expected[page] - rank)
+                for page, rank in graph.to_dict(ranks).items())
+            line += (f"  python {python:8.3f}s "
+                     f"(max difference {difference:.4f})")
+        print(line)
+
+
+def bench_sampler(args):
+    """
+    Time the cached pure Python sampler and the vectorized sampler,
+    and report how far each estimate is from power iteration.
+    """
+    graph = synthetic_graph(args.pages, args.degree)
+    exact = power_iteration(graph, pagerank.DAMPING, 1e-10)
+    print(f"{args.pages} pages, {graph.edges} links")
+
+    corpus = to_corpus(graph)
+    start = time.perf_counter()
+    ranks = pagerank.sample_pagerank(corpus, pagerank.DAMPING, args.python_samples)
+    elapsed = time.perf_counter() - start
+    error = np.abs(np.array([ranks[page] for page in graph.pages]) - exact).sum()
+    print(f"  python: {args.python_samples:>9} samples in {elapsed:7.3f}s "
+          f"(L1 error {error:.4f})")
+
+    start = time.perf_counter()
+    counts = sample_visits(graph, pagerank.DAMPING, args.samples,
+                           args.walkers, seed=0)
+    elapsed = time.perf_counter() - start
+    error = np.abs(counts / counts.sum() - exact).sum()
+    print(f"   numpy: {args.samples:>9} samples in {elapsed:7.3f}s "
+          f"(L1 error {error:.4f})")
+
+
+def bench_parallel(args):
+    """
+    Run the parallel sampler with growing worker counts until every
+    page's standard error is below `--accuracy`, and report the time
+    and samples it took and the largest real error.
+    """
+    graph = synthetic_graph(args.pages, args.degree)
+    exact = power_iteration(graph, pagerank.DAMPING, 1e-10)
+    print(f"{args.pages} pages, {graph.edges} links, {os.cpu_count()} CPUs")
+    for workers in args.workers:
+        start = time.perf_counter()
+        ranks, error, samples = parallel_sample(
+            graph, pagerank.DAMPING, args.accuracy, args.max_samples,
+            workers, seed=0)
+        elapsed = time.perf_counter() - start
+        print(f"  {workers:>3} workers: {elapsed:7.3f}s, {samples:>9} samples, "
+              f"max standard error {error.max():.5f}, "
+              f"max real error {np.abs(ranks - exact).max():.5f}")
+
+
+def write_corpus(directory, graph, padding=2000, seed=0):
+    """
+    Write `graph` as one HTML file per page into `directory`, with
+    `padding` characters of filler text around the links.
+    """
+    rng = random.Random(seed)
+    filler = "lorem ipsum <b>dolor</b> sit amet "
+    for i, page in enumerate(graph.pages):
+        links = graph.out_targets[graph.out_start[i]:graph.out_start[i + 1]]
+        body = [filler * (padding // len(filler))]
+        for target in links:
+            body.append(f'<li><a class="link" href="{graph.pages[target]}">'
+                        f'{rng.random()}</a></li>')
+            body.append(filler * rng.randint(0, 3))
+        with open(os.path.join(directory, page), "w") as f:
+            f.write("<html><body>" + "\n".join(body) + "</body></html>")
+
+
+def bench_crawl(args):
+    """
+    Compare `crawl` with the streaming crawler on a written corpus.
+    """
+    graph = synthetic_graph(args.pages, args.degree)
+    with tempfile.TemporaryDirectory() as directory:
+        write_corpus(directory, graph, args.padding)
+        start = time.perf_counter()
+        expected = pagerank.crawl(directory)
+        print(f"{args.pages} pages, crawl: {time.perf_counter() - start:.3f}s")
+
+        for workers in args.workers:
+            for processes in (False, True):
+                start = time.perf_counter()
+                pages = crawl_parallel(directory, workers, processes)
+                elapsed = time.perf_counter() - start
+                if pages != expected:
+                    raise Exception("crawl_parallel disagrees with crawl")
+                kind = "processes" if processes else "threads"
+                print(f"  {workers:>3} {kind:>9}: {elapsed:.3f}s")
+
+
+def bench_incremental(args):
+    """
+    Time an incremental update after changing a fraction of a written
+    corpus, against crawling and iterating it again from scratch.
+    """
+    graph = synthetic_graph(args.pages, args.degree)
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        write_corpus(directory, graph, args.padding)
+        start = time.perf_counter()
+        incremental_pagerank(directory, pagerank.DAMPING, pagerank.ACCURACY)
+        print(f"{args.pages} pages, first run: "
+              f"{time.perf_counter() - start:.3f}s")
+
+        # Point the links of the changed pages somewhere else
+        changed = rng.sample(graph.pages, max(1, int(args.pages * args.changed)))
+        for page in changed:
+            links = rng.sample(graph.pages, rng.randint(1, 2 * args.degree))
+            path = os.path.join(directory, page)
+            with open(path, "w") as f:
+                f.write("".join(f'<a href="{link}">x</a>\n' for link in links))
+            stat = os.stat(path)
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+        start = time.perf_counter()
+        ranks, changes, _ = incremental_pagerank(
+            directory, pagerank.DAMPING, pagerank.ACCURACY)
+        incremental = time.perf_counter() - start
+
+        start = time.perf_counter()
+        full = LinkGraph.from_corpus(pagerank.crawl(directory))
+        expected = full.to_dict(
+            power_iteration(full, pagerank.DAMPING, pagerank.ACCURACY))
+        scratch = time.perf_counter() - start
+
+    difference = max(abs(ranks[page] - expected[page]) for page in expected)
+    print(f"{changes['changed']} pages changed ({args.changed:.0%}): "
+          f"incremental {incremental:.3f}s, from scratch {scratch:.3f}s "
+          f"(max difference {difference:.5f})")
+
+
+def bench_solvers(args):
+    """
+    Compare the convergence of every solver on synthetic corpora of
+    different shapes, against a tightly converged power iteration.
+    """
+    shapes = [
+        ("sparse, many dangling", synthetic_graph(args.pages, 3, 0.3)),
+        ("average", synthetic_graph(args.pages, args.degree)),
+        ("dense, few dangling",
+         synthetic_graph(args.pages, 4 * args.degree, 0.01)),
+        ("local links", local_graph(args.pages, args.degree)),
+    ]
+    for label, graph in shapes:
+        expected = power_iteration(graph, args.damping, 1e-14, 10 ** 5)
+        print(f"{label}: {len(graph)} pages, {graph.edges} links")
+        for name, solver in sorted(SOLVERS.items()):
+            result = solver(graph, args.damping, args.tolerance,
+                            args.max_iterations)
+            error = np.abs(result.ranks - expected).sum()
+            print(f"  {name:>12}: {result.iterations:>4} iterations "
+                  f"{result.seconds:8.3f}s  "
+                  f"residual {result.residuals[-1]:.1e}  error {error:.1e}"
+                  + ("" if result.converged else "  (did not converge)"))
+
+
+def bench_personalized(args):
+    """
+    Time personalized PageRank for batches of random teleport vectors,
+    solved one at a time and as one block, and report throughput.
+    """
+    graph = synthetic_graph(args.pages, args.degree)
+    rng = np.random.default_rng(0)
+    print(f"{len(graph)} pages, {graph.edges} links")
+    for k in args.vectors:
+        # Each user jumps to a few favourite pages
+        teleports = np.zeros((len(graph), k))
+        for column in range(k):
+            favourites = rng.choice(len(graph), args.favourites, replace=False)
+            teleports[favourites, column] = 1
+
+        start = time.perf_counter()
+        block = block_power_iteration(
+            graph, pagerank.DAMPING, teleports, args.tolerance)
+        blocked = time.perf_counter() - start
+        line = (f"{k:>5} vectors: block {blocked:8.3f}s "
+                f"({k / blocked:8.1f} vectors/s)")
+
+        if k <= args.separate_limit:
+            start = time.perf_counter()
+            separate = np.column_stack([
+                block_power_iteration(graph, pagerank.DAMPING,
+                                      teleports[:, [column]],
+                                      args.tolerance)[:, 0]
+                for column in range(k)
+            ])
+            one_by_one = time.perf_counter() - start
+            difference = np.abs(separate - block).sum(axis=0).max()
+            line += (f"  one at a time {one_by_one:8.3f}s "
+                     f"({k / one_by_one:8.1f} vectors/s, "
+                     f"max difference {difference:.1e})")
+        print(line)
+
+
+def bench_format(args):
+    """
+    Time saving and loading the binary graph format against rebuilding
+    a LinkGraph from a crawled dictionary, for a graph of `--pages`
+    pages and about `--degree` links per page.
+    """
+    graph = synthetic_graph(args.pages, args.degree)
+    corpus = to_corpus(graph)
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "corpus.graph")
+        start = time.perf_counter()
+        graph.save(filename)
+        save = time.perf_counter() - start
+
+        start = time.perf_counter()
+        loaded = LinkGraph.load(filename)
+        load = time.perf_counter() - start
+
+        start = time.perf_counter()
+        LinkGraph.from_corpus(corpus)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ranks = power_iteration(loaded, pagerank.DAMPING, pagerank.ACCURACY)
+        iterate = time.perf_counter() - start
+        difference = np.abs(
+            ranks - power_iteration(graph, pagerank.DAMPING,
+                                    pagerank.ACCURACY)).max()
+
+        print(f"{len(graph)} pages, {graph.edges} links, "
+              f"{os.path.getsize(filename) / 2 ** 20:.1f} MiB file")
+        print(f"  save {save:.3f}s, load {load * 1000:.2f}ms, "
+              f"from dictionary {build:.3f}s")
+        print(f"  iterate mapped graph {iterate:.3f}s "
+              f"(max difference {difference:.1e})")
+
+
+def bench_outofcore(args):
+    """
+    Write a synthetic graph of about `--links` links to disk, then run
+    the out-of-core engine over it, reporting I/O and iteration times.
+    """
+    pages = max(1, round(args.links / (args.degree * 0.95)))
+    with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+        filename = os.path.join(directory, "synthetic.graph")
+        start = time.perf_counter()
+        links = write_synthetic_graph(filename, pages, args.degree,
+                                      block_links=args.block_links)
+        print(f"{pages} pages, {links} links: wrote "
+              f"{os.path.getsize(filename) / 2 ** 30:.2f} GiB in "
+              f"{time.perf_counter() - start:.1f}s")
+        reset_peak_rss()
+        disk = disk_reads()
+        result, bytes_read = out_of_core_pagerank(
+            filename, pagerank.DAMPING, pagerank.ACCURACY,
+            block_links=args.block_links)
+        disk = disk_reads() - disk if disk is not None else None
+        print(f"  {result.iterations} iterations in {result.seconds:.1f}s "
+              f"({result.seconds / result.iterations:.2f}s each)")
+        print(f"  streamed {bytes_read / 2 ** 30:.2f} GiB "
+              f"({bytes_read / result.iterations / 2 ** 30:.2f} GiB "
+              "per iteration)"
+              + (f", {disk / 2 ** 30:.2f} GiB from disk"
+                 if disk is not None else ""))
+        print(f"  peak RSS {peak_rss() / 2 ** 20:.0f} MiB, "
+              f"rank vectors {pages * 8 * 4 / 2 ** 20:.0f} MiB")
+        if pages <= args.check_limit:
+            graph = LinkGraph.load(filename)
+            expected = power_iteration(graph, pagerank.DAMPING,
+                                       pagerank.ACCURACY)
+            rebuilt = LinkGraph(graph.pages, graph.out_start,
+                                graph.out_targets)
+            if not (np.array_equal(rebuilt.in_start, graph.in_start) and
+                    np.array_equal(rebuilt.in_sources, graph.in_sources)):
+                raise Exception("incoming links do not match outgoing links")
+            difference = np.abs(result.ranks - expected).max()
+            print(f"  max difference from in-memory iteration "
+                  f"{difference:.1e}")
+
+
+def peak_rss():
+    """
+    Return the peak resident set size of this process in bytes, since
+    the last `reset_peak_rss` where Linux supports resetting it.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def reset_peak_rss():
+    """
+    Start measuring `peak_rss` afresh, if the kernel allows it.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def disk_reads():
+    """
+    Return the bytes this process has had read from disk, or None
+    where the kernel does not report it.
+    """
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("read_bytes:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks for pagerank.py.")
+    parser.add_argument("--degree", type=int, default=10,
+                        help="average links per page")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    sparse = subparsers.add_parser(
+        "sparse", help="sparse power iteration on synthetic graphs")
+    sparse.add_argument("--sizes", nargs="+", type=int,
+                        default=[10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6])
+    sparse.add_argument("--python-limit", type=int, default=2000,
+                        help="largest graph to run iterate_pagerank on")
+    sparse.set_defaults(run=bench_sparse)
+
+    sampler = subparsers.add_parser(
+        "sampler", help="pure Python against vectorized sampling")
+    sampler.add_argument("--pages", type=int, default=1000)
+    sampler.add_argument("--samples", type=int, default=10 ** 6)
+    sampler.add_argument("--python-samples", type=int, default=10 ** 5)
+    sampler.add_argument("--walkers", type=int, default=1024)
+    sampler.set_defaults(run=bench_sampler)
+
+    parallel = subparsers.add_parser(
+        "parallel", help="parallel sampling until ACCURACY is met")
+    parallel.add_argument("--pages", type=int, default=1000)
+    parallel.add_argument("--accuracy", type=float, default=pagerank.ACCURACY)
+    parallel.add_argument("--max-samples", type=int, default=10 ** 8)
+    parallel.add_argument("--workers", nargs="+", type=int,
+                          default=[1, 2, 4, 8])
+    parallel.set_defaults(run=bench_parallel)
+
+    crawl = subparsers.add_parser(
+        "crawl", help="crawl against the parallel streaming crawler")
+    crawl.add_argument("--pages", type=int, default=5000)
+    crawl.add_argument("--padding", type=int, default=2000,
+                       help="characters of filler text per page")
+    crawl.add_argument("--workers", nargs="+", type=int, default=[1, 4])
+    crawl.set_defaults(run=bench_crawl)
+
+    incremental = subparsers.add_parser(
+        "incremental", help="incremental update after changing a few pages")
+    incremental.add_argument("--pages", type=int, default=20000)
+    incremental.add_argument("--changed", type=float, default=0.01,
+                             help="fraction of pages changed")
+    incremental.add_argument("--padding", type=int, default=2000)
+    incremental.set_defaults(run=bench_incremental)
+
+    solvers = subparsers.add_parser(
+        "solvers", help="iterations and time of each convergence solver")
+    solvers.add_argument("--pages", type=int, default=10 ** 4)
+    solvers.add_argument("--damping", type=float, default=pagerank.DAMPING)
+    solvers.add_argument("--tolerance", type=float, default=1e-8)
+    solvers.add_argument("--max-iterations", type=int, default=10 ** 4)
+    solvers.set_defaults(run=bench_solvers)
+
+    personalized = subparsers.add_parser(
+        "personalized", help="throughput of batched personalized PageRank")
+    personalized.add_argument("--pages", type=int, default=20000)
+    personalized.add_argument("--vectors", nargs="+", type=int,
+                              default=[1, 8, 64, 256])
+    personalized.add_argument("--favourites", type=int, default=10,
+                              help="pages each teleport vector jumps to")
+    personalized.add_argument("--tolerance", type=float, default=1e-6)
+    personalized.add_argument("--separate-limit", type=int, default=64,
+                              help="largest batch to also solve "
+                                   "one vector at a time")
+    personalized.set_defaults(run=bench_personalized)
+
+    graph_format = subparsers.add_parser(
+        "format", help="binary graph files against crawled dictionaries")
+    graph_format.add_argument("--pages", type=int, default=10 ** 5)
+    graph_format.set_defaults(run=bench_format)
+
+    outofcore = subparsers.add_parser(
+        "outofcore", help="out-of-core iteration over a graph on disk")
+    outofcore.add_argument("--links", type=float, default=10 ** 8,
+                           help="approximate links in the graph")
+    outofcore.add_argument("--block-links", type=int, default=BLOCK_LINKS)
+    outofcore.add_argument("--directory",
+                           help="where to write the graph file")
+    outofcore.add_argument("--check-limit", type=int, default=10 ** 6,
+                           help="largest graph to also iterate in memory")
+    outofcore.set_defaults(run=bench_outofcore)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
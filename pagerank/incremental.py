@@ -0,0 +1,97 @@
+import json
+import os
+
+import numpy as np
+
+from crawler import extract_links
+from linkgraph import LinkGraph
+from solvers import power_iteration
+
+# File in the corpus directory holding the last crawl and ranks
+STATE_FILE = ".pagerank.json"
+STATE_VERSION = 1
+
+
+def incremental_pagerank(directory, damping_factor, tolerance):
+    """
+    Return (ranks, changes, corpus) for the corpus in `directory`,
+    reusing the state saved there by the previous call.
+
+    Only files whose size or modification time differ from the saved
+    state are re-crawled, and iteration starts from the saved ranks
+    instead of the uniform vector, so a small edit to a large corpus
+    costs a few files' parsing and a few sweeps. `ranks` maps pages to
+    PageRank; `changes` counts the added, changed and removed files;
+    `corpus` is the dictionary `crawl` would return, rebuilt from the
+    saved links, so callers need not crawl the directory themselves.
+    """
+    state = load_state(directory, damping_factor)
+    files, changes = dict(), {"added": 0, "changed": 0, "removed": 0}
+
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".html"):
+                continue
+            stat = entry.stat()
+            signature = [stat.st_size, stat.st_mtime_ns]
+            saved = state["files"].get(entry.name)
+            if saved is not None and saved["signature"] == signature:
+                files[entry.name] = saved
+                continue
+            changes["changed" if saved is not None else "added"] += 1
+            links = extract_links(entry.path) - {entry.name}
+            files[entry.name] = {"signature": signature, "links": sorted(links)}
+    changes["removed"] = len(set(state["files"]) - set(files))
+
+    # Rebuild the corpus, as `crawl` would, from the saved raw links
+    corpus = {
+        page: {link for link in data["links"] if link in files}
+        for page, data in files.items()
+    }
+    graph = LinkGraph.from_corpus(corpus)
+
+    # New pages start from the average rank of a page
+    start = None
+    if state["ranks"]:
+        start = np.array([
+            state["ranks"].get(page, 1 / len(graph)) for page in graph.pages
+        ])
+    ranks = graph.to_dict(
+        power_iteration(graph, damping_factor, tolerance, start=start))
+
+    save_state(directory, {
+        "version": STATE_VERSION,
+        "damping": damping_factor,
+        "files": files,
+        "ranks": ranks,
+    })
+    return ranks, changes, corpus
+
+
+def load_state(directory, damping_factor):
+    """
+    Return the saved state for `directory`, or an empty one if there is
+    none or it is from another version or damping factor.
+    """
+    empty = {"files": {}, "ranks": {}}
+    try:
+        with open(os.path.join(directory, STATE_FILE)) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return empty
+    if (state.get("version") != STATE_VERSION or
+            state.get("damping") != damping_factor):
+        return empty
+    return state
+
+
+def save_state(directory, state):
+    """
+    Write `state` to the corpus directory, replacing any older state.
+    """
+    filename = os.path.join(directory, STATE_FILE)
+    temporary = f"{filename}.tmp"
+    # json.dumps uses the C encoder, which json.dump to a file does not
+    with open(temporary, "w") as f:
+        f.write(json.dumps(state))
+    os.replace(temporary, filename)
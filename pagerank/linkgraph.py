@@ -0,0 +1,257 @@
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+# Graph files start with this magic string and format version
+GRAPH_MAGIC = b"PRGRAPH\0"
+GRAPH_VERSION = 1
+
+
+class LinkGraph():
+    """
+    Link graph of a corpus as compressed sparse row (CSR) arrays.
+
+    Pages are numbered 0..n-1 in the order of `pages`. The pages linked
+    to by page `i` are `out_targets[out_start[i]:out_start[i + 1]]`, and
+    the pages linking to it are `in_sources[in_start[i]:in_start[i + 1]]`.
+    Like `crawl`, the graph has no self-links and no repeated links.
+    """
+
+    def __init__(self, pages, out_start, out_targets, in_start=None,
+                 in_sources=None):
+        n = len(pages)
+        self.pages = pages
+        self.out_start = out_start
+        self.out_targets = out_targets
+        self.out_degree = np.diff(out_start)
+        self.dangling = self.out_degree == 0
+        if in_start is not None:
+            self.in_start = in_start
+            self.in_sources = in_sources
+            return
+
+        # Group the same links by target for pulling rank along them
+        order = np.argsort(out_targets, kind="stable")
+        sources = np.repeat(np.arange(n, dtype=out_targets.dtype),
+                            self.out_degree)
+        self.in_sources = sources[order]
+        self.in_start = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(out_targets, minlength=n),
+                  out=self.in_start[1:])
+
+    @classmethod
+    def from_corpus(cls, corpus):
+        """
+        Build a graph from a `crawl` dictionary of page -> linked pages.
+        A corpus that is already a LinkGraph is returned as it is.
+        """
+        if isinstance(corpus, cls):
+            return corpus
+        pages = sorted(corpus)
+        index = {page: i for i, page in enumerate(pages)}
+        sources, targets = [], []
+        for page, links in corpus.items():
+            for link in links:
+                sources.append(index[page])
+                targets.append(index[link])
+        return cls.from_edges(pages, np.array(sources, dtype=np.int64),
+                              np.array(targets, dtype=np.int64))
+
+    @classmethod
+    def from_edges(cls, pages, sources, targets):
+        """
+        Build a graph from parallel arrays of link sources and targets,
+        dropping self-links and repeated links.
+        """
+        n = len(pages)
+        keep = sources != targets
+        keys = np.sort(sources[keep].astype(np.int64) * n + targets[keep])
+        unique = np.empty(len(keys), dtype=bool)
+        unique[:1] = True
+        np.not_equal(keys[1:], keys[:-1], out=unique[1:])
+        keys = keys[unique]
+        index_type = np.int32 if n < 2 ** 31 else np.int64
+        out_targets = (keys % n).astype(index_type)
+        out_start = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // n, minlength=n), out=out_start[1:])
+        return cls(pages, out_start, out_targets)
+
+    def __len__(self):
+        return len(self.pages)
+
+    @property
+    def edges(self):
+        return len(self.out_targets)
+
+    def to_dict(self, values):
+        """
+        Return a dictionary mapping each page name to its entry
+        of the vector `values`.
+        """
+        return {page: float(value) for page, value in zip(self.pages, values)}
+
+    def save(self, filename):
+        """
+        Write the graph to a file that `load` can map back: a JSON
+        header, then the page names as UTF-8 with their offsets and the
+        outgoing and incoming CSR arrays, each 8-byte aligned.
+        """
+        names = PageNames.from_strings(self.pages)
+        with GraphWriter(filename) as writer:
+            writer.write("out_start", self.out_start)
+            writer.write("out_targets", self.out_targets)
+            writer.write("in_start", self.in_start)
+            writer.write("in_sources", self.in_sources)
+            writer.write("pages.offsets", names.offsets)
+            writer.write("pages.data", names.data)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Map a graph written by `save` into memory. Nothing is read or
+        copied up front except the out-degrees, so loading takes about
+        as long as one pass over the pages.
+        """
+        _, sections = map_sections(filename)
+        pages = PageNames(sections["pages.offsets"], sections["pages.data"])
+        return cls(pages, sections["out_start"], sections["out_targets"],
+                   sections["in_start"], sections["in_sources"])
+
+
+def map_sections(filename):
+    """
+    Map a graph file into memory and return (buffer, sections), where
+    `sections` maps each section name to a NumPy array over `buffer`.
+    """
+    with open(filename, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    start = len(GRAPH_MAGIC) + 8
+    if len(buffer) < start or buffer[:len(GRAPH_MAGIC)] != GRAPH_MAGIC:
+        raise ValueError(f"{filename} is not a link graph file")
+    header_length, = struct.unpack_from("<Q", buffer, len(GRAPH_MAGIC))
+    header = json.loads(buffer[start:start + header_length])
+    if header["version"] != GRAPH_VERSION:
+        raise ValueError(
+            f"{filename} has link graph format {header['version']}, "
+            f"not {GRAPH_VERSION}")
+
+    base = start + header_length
+    sections = {
+        name: np.frombuffer(buffer, dtype=np.dtype(dtype), count=count,
+                            offset=base + offset)
+        for name, (dtype, offset, count) in header["sections"].items()
+    }
+    return buffer, sections
+
+
+class GraphWriter():
+    """
+    Writes a graph file one section at a time, each given whole or in
+    chunks by repeated `write` calls, so a graph too large for memory
+    can be streamed to disk. Use it as a context manager: the header is
+    filled in and the file moved into place on a clean exit.
+
+    Space for the header is reserved up front, since the sections'
+    sizes are not known until they have been written.
+    """
+
+    def __init__(self, filename, header_space=4096):
+        self.filename = filename
+        self.header_space = header_space
+        self.layout = {}
+        self.section = None
+        self.offset = 0
+
+    def __enter__(self):
+        self.file = open(f"{self.filename}.tmp", "wb")
+        self.file.write(GRAPH_MAGIC)
+        self.file.write(struct.pack("<Q", self.header_space))
+        self.file.write(b" " * self.header_space)
+        return self
+
+    def write(self, name, values):
+        """
+        Append `values` to section `name`, starting the section if it
+        is not the one written last.
+        """
+        values = np.ascontiguousarray(values)
+        if name != self.section:
+            if name in self.layout:
+                raise ValueError(f"section {name} was already written")
+            self._pad()
+            self.layout[name] = [values.dtype.str, self.offset, 0]
+            self.section = name
+        dtype, _, _ = self.layout[name]
+        if values.dtype.str != dtype:
+            raise ValueError(f"section {name} holds {dtype}, "
+                             f"not {values.dtype.str}")
+        self.file.write(values.tobytes())
+        self.layout[name][2] += len(values)
+        self.offset += values.nbytes
+
+    def __exit__(self, kind, value, traceback):
+        try:
+            if kind is not None:
+                return
+            self._pad()
+            header = json.dumps({
+                "version": GRAPH_VERSION,
+                "sections": self.layout,
+            }).encode()
+            if len(header) > self.header_space:
+                raise ValueError("graph file header does not fit")
+            self.file.seek(len(GRAPH_MAGIC) + 8)
+            self.file.write(header)
+        finally:
+            self.file.close()
+        if kind is None:
+            os.replace(f"{self.filename}.tmp", self.filename)
+        else:
+            os.remove(f"{self.filename}.tmp")
+
+    def _pad(self):
+        """
+        Pad the section written last out to a multiple of 8 bytes.
+        """
+        padding = -self.offset % 8
+        self.file.write(b"\0" * padding)
+        self.offset += padding
+
+
+class PageNames():
+    """
+    Read-only sequence of page names stored as one UTF-8 buffer plus
+    an array of offsets; name `i` is data[offsets[i]:offsets[i + 1]].
+    """
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    @classmethod
+    def from_strings(cls, strings):
+        if isinstance(strings, cls):
+            return strings
+        encoded = [string.encode() for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(string) for string in encoded], out=offsets[1:])
+        return cls(offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("page index out of range")
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode()
+
+    def __iter__(self):
+        data = self.data.tobytes()
+        offsets = self.offsets.tolist()
+        for start, end in zip(offsets, offsets[1:]):
+            yield data[start:end].decode()
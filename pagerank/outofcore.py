@@ -0,0 +1,91 @@
+import mmap
+import time
+
+import numpy as np
+
+from linkgraph import PageNames, map_sections
+from solvers import Convergence, pull
+
+# Incoming links streamed from disk at a time
+BLOCK_LINKS = 2 ** 22
+
+
+def out_of_core_pagerank(filename, damping_factor, tolerance,
+                         max_iterations=1000, block_links=BLOCK_LINKS):
+    """
+    Return (convergence, bytes_read) for PageRank over the graph file
+    `filename`, computed without holding its links in memory.
+
+    Pages are split into blocks with about `block_links` incoming links
+    each. Every iteration streams each block's incoming links from the
+    memory-mapped file, pulls rank along them into the block's pages,
+    then lets the kernel drop the block from memory, so only the rank
+    vectors stay resident. `bytes_read` is the volume of link data
+    streamed over all iterations.
+    """
+    clock = time.perf_counter()
+    buffer, sections = map_sections(filename)
+    address = np.frombuffer(buffer, dtype=np.uint8).ctypes.data
+    in_start, in_sources = sections["in_start"], sections["in_sources"]
+
+    out_degree = np.diff(sections["out_start"])
+    n = len(out_degree)
+    dangling = out_degree == 0
+    inverse_degree = np.zeros(n)
+    np.divide(1.0, out_degree, out=inverse_degree, where=~dangling)
+    del out_degree
+    bytes_read = _release(buffer, address, sections["out_start"])
+
+    bounds = np.unique(np.append(
+        np.searchsorted(in_start, np.arange(0, in_start[-1], block_links)),
+        [0, n]))
+    ranks = np.full(n, 1 / n)
+    new_ranks = np.empty(n)
+    residuals = []
+    for _ in range(max_iterations):
+        shares = ranks * inverse_degree
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            new_ranks[lo:hi] = pull(in_start, in_sources, shares, lo, hi)
+            bytes_read += _release(
+                buffer, address, in_start[lo:hi + 1],
+                in_sources[in_start[lo]:in_start[hi]])
+        del shares
+
+        dangling_rank = ranks[dangling].sum()
+        new_ranks *= damping_factor
+        new_ranks += (damping_factor * dangling_rank +
+                      1 - damping_factor) / n
+        residuals.append(np.abs(new_ranks - ranks).sum())
+        ranks, new_ranks = new_ranks, ranks
+        if residuals[-1] <= tolerance:
+            break
+
+    converged = bool(residuals) and residuals[-1] <= tolerance
+    return (Convergence(ranks, residuals, time.perf_counter() - clock,
+                        converged),
+            bytes_read)
+
+
+def page_names(filename):
+    """
+    Return the page names of the graph file `filename`, memory-mapped.
+    """
+    _, sections = map_sections(filename)
+    return PageNames(sections["pages.offsets"], sections["pages.data"])
+
+
+def _release(buffer, address, *arrays):
+    """
+    Tell the kernel the parts of `buffer` under `arrays` will not be
+    needed again soon, and return how many bytes they span.
+    """
+    size = 0
+    for values in arrays:
+        size += values.nbytes
+        if not values.nbytes or not hasattr(mmap, "MADV_DONTNEED"):
+            continue
+        start = values.ctypes.data - address
+        end = start + values.nbytes
+        start -= start % mmap.PAGESIZE
+        buffer.madvise(mmap.MADV_DONTNEED, start, end - start)
+    return size
@@ -1,8 +1,16 @@
+import argparse
 import os
 import random
 import re
-import sys
-from bisect import bisect_left
+
+import numpy as np
+
+from crawler import crawl_parallel
+from incremental import incremental_pagerank
+from linkgraph import LinkGraph
+from outofcore import out_of_core_pagerank, page_names
+from sampling import parallel_sample, sample_visits
+from solvers import SOLVERS, block_power_iteration, power_iteration
 
 DAMPING = 0.85
 SAMPLES = 10000
@@ -10,15 +18,91 @@ ACCURACY = 0.001
 
 
 def main():
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python pagerank.py corpus")
-    corpus = crawl(sys.argv[1])
-    ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
-    print(f"PageRank Results from Sampling (n = {SAMPLES})")
-    for page in sorted(ranks):
-        print(f"  {page}: {ranks[page]:.4f}")
-    ranks = iterate_pagerank(corpus, DAMPING)
-    print(f"PageRank Results from Iteration")
+    parser = argparse.ArgumentParser(
+        description="Compute PageRank for a corpus of HTML pages.")
+    parser.add_argument("corpus",
+                        help="directory of HTML pages, or a graph file "
+                             "written by --export")
+    parser.add_argument("--export", metavar="FILE",
+                        help="save the crawled corpus as a graph file")
+    parser.add_argument("--engine", choices=sorted(ITERATION_ENGINES),
+                        default="python",
+                        help="implementation used for iteration")
+    parser.add_argument("--solver", choices=sorted(SOLVERS),
+                        help="iterate over a LinkGraph with this solver "
+                             "and report how it converged")
+    parser.add_argument("--sampler", choices=sorted(SAMPLERS) + ["parallel"],
+                        default="python",
+                        help="implementation used for sampling")
+    parser.add_argument("--samples", type=int, default=SAMPLES,
+                        help="samples to draw; at most this many "
+                             "for the parallel sampler")
+    parser.add_argument("--workers", type=int,
+                        help="processes for the parallel sampler")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed for the parallel sampler")
+    parser.add_argument("--crawl-workers", type=int,
+                        help="crawl with this many threads, "
+                             "streaming each file in chunks")
+    parser.add_argument("--out-of-core", action="store_true",
+                        help="iterate a graph file block by block "
+                             "without loading its links into memory")
+    parser.add_argument("--incremental", action="store_true",
+                        help="iterate from the ranks saved by the last run, "
+                             "re-crawling only changed files")
+    args = parser.parse_args()
+
+    if args.incremental and os.path.isfile(args.corpus):
+        parser.error("--incremental needs a corpus directory")
+    if args.out_of_core:
+        if not os.path.isfile(args.corpus):
+            parser.error("--out-of-core needs a graph file")
+        result, bytes_read = out_of_core_pagerank(
+            args.corpus, DAMPING, ACCURACY)
+        print(f"PageRank Results from Out-of-Core Iteration "
+              f"({result.iterations} iterations, "
+              f"{bytes_read / 2 ** 20:.1f} MiB read, {result.seconds:.3f}s)")
+        for page, rank in sorted(zip(page_names(args.corpus), result.ranks)):
+            print(f"  {page}: {rank:.4f}")
+        return
+
+    if args.incremental:
+        # Crawls only the files changed since the last run
+        incremental_ranks, changes, corpus = incremental_pagerank(
+            args.corpus, DAMPING, ACCURACY)
+    elif os.path.isfile(args.corpus):
+        corpus = LinkGraph.load(args.corpus)
+    elif args.crawl_workers:
+        corpus = crawl_parallel(args.corpus, args.crawl_workers)
+    else:
+        corpus = crawl(args.corpus)
+    if args.export:
+        LinkGraph.from_corpus(corpus).save(args.export)
+    if args.sampler == "parallel":
+        ranks, errors, samples = sample_pagerank_parallel(
+            corpus, DAMPING, args.samples, args.workers, args.seed)
+        print(f"PageRank Results from Parallel Sampling (n = {samples})")
+        for page in sorted(ranks):
+            print(f"  {page}: {ranks[page]:.4f} ± {errors[page]:.4f}")
+    else:
+        ranks = SAMPLERS[args.sampler](corpus, DAMPING, args.samples)
+        print(f"PageRank Results from Sampling (n = {args.samples})")
+        for page in sorted(ranks):
+            print(f"  {page}: {ranks[page]:.4f}")
+    if args.incremental:
+        ranks = incremental_ranks
+        print("PageRank Results from Incremental Iteration "
+              f"({changes['added']} added, {changes['changed']} changed, "
+              f"{changes['removed']} removed)")
+    elif args.solver:
+        ranks, result = iterate_pagerank_solver(corpus, DAMPING, args.solver)
+        print(f"PageRank Results from Iteration ({args.solver}: "
+              f"{result.iterations} iterations, "
+              f"residual {result.residuals[-1]:.2e}, "
+              f"{result.seconds:.3f}s)")
+    else:
+        ranks = ITERATION_ENGINES[args.engine](corpus, DAMPING)
+        print(f"PageRank Results from Iteration")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
 
@@ -86,45 +170,95 @@ def sample_pagerank(corpus, damping_factor, n):
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
-    """
-    page = random.choice(list(corpus))
-    pagerank = {page: 1}
-    counter = 0
 
-    while counter < n:
-    	transition = transition_model(corpus, page, damping_factor)
-    	pages, cumprobs = [], []
-    	total = 0
+    Rather than building `transition_model` for every step, each step
+    draws from it as the mixture it is: with probability
+    `damping_factor` a link chosen uniformly from the page's links
+    (kept as a tuple per page, built once), and otherwise, or when the
+    page has no links, a page chosen uniformly from the corpus.
+    A step costs constant time and no table over the corpus is built.
 
-    	for k, v in transition.items():
-    		pages.append(k)
-    		total += v
-    		cumprobs.append(total)
+    A LinkGraph, such as one loaded from a graph file, is sampled with
+    `sample_pagerank_vectorized` instead.
+    """
+    if isinstance(corpus, LinkGraph):
+        return sample_pagerank_vectorized(corpus, damping_factor, n)
 
-    	r = random.random()
-    	page = pages[bisect_left(cumprobs, r)]
+    pages = list(corpus)
+    links = {page: tuple(corpus[page]) for page in corpus}
+    pagerank = {page: 0 for page in corpus}
+    page = random.choice(pages)
 
-    	pagerank[page] = pagerank.get(page, 0) + 1
-    	counter += 1
+    for _ in range(n):
+        pagerank[page] += 1
+        if links[page] and random.random() < damping_factor:
+            page = random.choice(links[page])
+        else:
+            page = random.choice(pages)
 
     for page in pagerank:
-    	pagerank[page] = pagerank[page] / n
+        pagerank[page] = pagerank[page] / n
 
     return pagerank
 
 
-def incoming_pages(corpus, link):
-	"""
-	Returns a dict of all the pages containing the specified link
-	with the total number of links on the page as values.
-	"""
-	pages = dict()
-	for page in corpus:
-		if link in corpus[page]:
-			pages[page] = len(corpus[page])
-	return pages
+def sample_pagerank_vectorized(corpus, damping_factor, n):
+    """
+    Return the same kind of estimate as `sample_pagerank`, from
+    many random surfers moved together in NumPy arrays.
+    """
+    graph = LinkGraph.from_corpus(corpus)
+    counts = sample_visits(graph, damping_factor, n)
+    return graph.to_dict(counts / counts.sum())
+
+
+def sample_pagerank_parallel(corpus, damping_factor, n, workers=None, seed=0):
+    """
+    Estimate PageRank from independent batches of random surfers run
+    across `workers` processes, drawing at most `n` samples but
+    stopping as soon as every page's standard error is below ACCURACY.
+
+    Return (ranks, errors, samples): dictionaries of each page's
+    estimated PageRank and its standard error, and the number of
+    samples drawn. Results are reproducible for a given `seed` and
+    number of workers.
+    """
+    graph = LinkGraph.from_corpus(corpus)
+    ranks, errors, samples = parallel_sample(
+        graph, damping_factor, ACCURACY, n, workers, seed)
+    return graph.to_dict(ranks), graph.to_dict(errors), samples
+
+
+def index_links(corpus):
+    """
+    Return (inbound, out_degree) for a corpus, where `inbound` maps
+    each page to the set of pages linking to it, and `out_degree` maps
+    each page to the number of links on it.
+
+    Build it once per corpus and pass it to `incoming_pages` and
+    `iterate_pagerank` rather than scanning the corpus for every page.
+    """
+    inbound = {page: set() for page in corpus}
+    out_degree = dict()
+    for page, links in corpus.items():
+        out_degree[page] = len(links)
+        for link in links:
+            inbound[link].add(page)
+    return inbound, out_degree
+
+
+def incoming_pages(corpus, link, index=None):
+    """
+    Returns a dict of all the pages containing the specified link
+    with the total number of links on the page as values.
 
-def iterate_pagerank(corpus, damping_factor):
+    Reads from `index`, as returned by `index_links`, if given.
+    """
+    inbound, out_degree = index or index_links(corpus)
+    return {page: out_degree[page] for page in inbound[link]}
+
+
+def iterate_pagerank(corpus, damping_factor, index=None):
     """
     Return PageRank values for each page by iteratively updating
     PageRank values until convergence.
@@ -132,33 +266,101 @@ def iterate_pagerank(corpus, damping_factor):
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
+
+    Pages are updated in place, each from its incoming links in
+    `index` (built with `index_links` if not given). A page with no
+    links counts as linking to every page, but instead of giving it
+    those links, the rank of all such pages is kept as one running
+    total that every page receives an even share of.
+
+    A LinkGraph, such as one loaded from a graph file, is iterated with
+    `iterate_pagerank_sparse` instead.
     """
-    
+    if isinstance(corpus, LinkGraph):
+        return iterate_pagerank_sparse(corpus, damping_factor)
+
+    inbound, out_degree = index or index_links(corpus)
     pagerank = {page: 1/len(corpus) for page in corpus}
-    # Make a copy of the corpus
-    # where all the linkless pages
-    # lead to every other page in the corpus.
-    corpus_adjusted = corpus.copy()
-    for page in corpus_adjusted:
-    	if not corpus_adjusted[page]:
-    		corpus_adjusted[page] = set((page for page in corpus))
+    dangling = [page for page in corpus if not out_degree[page]]
+    dangling_rank = sum(pagerank[page] for page in dangling)
 
     random_visit = (1 - damping_factor) / len(corpus)
 
     while True:
-    	convergent = True
-    	for page in corpus_adjusted:
-    		new_rank = sum(pagerank[incoming_page] / numlinks
-    			for incoming_page, numlinks
-    			in incoming_pages(corpus_adjusted, page).items()
-    		)
-    		new_rank = new_rank * damping_factor + random_visit
-    		if abs(pagerank[page] - new_rank) > ACCURACY:
-    			convergent = False
-    		pagerank[page] = new_rank
-    	if convergent:
-    		break
+        convergent = True
+        for page in corpus:
+            new_rank = sum(pagerank[incoming_page] / out_degree[incoming_page]
+                           for incoming_page in inbound[page])
+            new_rank += dangling_rank / len(corpus)
+            new_rank = new_rank * damping_factor + random_visit
+            if abs(pagerank[page] - new_rank) > ACCURACY:
+                convergent = False
+            if not out_degree[page]:
+                dangling_rank += new_rank - pagerank[page]
+            pagerank[page] = new_rank
+        if convergent:
+            break
     return pagerank
-    
+
+
+def iterate_pagerank_sparse(corpus, damping_factor):
+    """
+    Return the same dictionary as `iterate_pagerank`, computed by
+    power iteration over a sparse matrix of the links.
+
+    The matrix is built once, so each sweep costs time proportional to
+    the number of links rather than the square of the number of pages.
+    """
+    graph = LinkGraph.from_corpus(corpus)
+    ranks = power_iteration(graph, damping_factor, ACCURACY)
+    return graph.to_dict(ranks)
+
+
+def iterate_pagerank_solver(corpus, damping_factor, solver):
+    """
+    Return (ranks, convergence) for a corpus, where `ranks` is the
+    dictionary returned by `iterate_pagerank` and `convergence` is the
+    Convergence reported by the named solver from `SOLVERS`.
+    """
+    graph = LinkGraph.from_corpus(corpus)
+    result = SOLVERS[solver](graph, damping_factor, ACCURACY)
+    return graph.to_dict(result.ranks), result
+
+
+def personalized_pagerank(corpus, damping_factor, personalizations):
+    """
+    Return a list of PageRank dictionaries, one for each dictionary in
+    `personalizations`. Each maps pages to how likely a random jump is
+    to land on them (pages left out get none; weights need not sum to
+    1), replacing the uniform jump of `iterate_pagerank`.
+
+    All the vectors are solved together by block power iteration.
+    Raises ValueError if a dictionary is empty, has a negative weight,
+    or its weights sum to zero.
+    """
+    graph = LinkGraph.from_corpus(corpus)
+    index = {page: i for i, page in enumerate(graph.pages)}
+    teleports = np.zeros((len(graph), len(personalizations)))
+    for column, weights in enumerate(personalizations):
+        for page, weight in weights.items():
+            teleports[index[page], column] = weight
+    ranks = block_power_iteration(graph, damping_factor, teleports, ACCURACY)
+    return [graph.to_dict(ranks[:, column])
+            for column in range(len(personalizations))]
+
+
+# Implementations of sampling selectable with `--sampler`
+SAMPLERS = {
+    "python": sample_pagerank,
+    "numpy": sample_pagerank_vectorized,
+}
+
+# Implementations of iteration selectable with `--engine`
+ITERATION_ENGINES = {
+    "python": iterate_pagerank,
+    "sparse": iterate_pagerank_sparse,
+}
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,152 @@
+import math
+import multiprocessing
+import os
+
+import numpy as np
+
+# Surfer steps recorded between two tallies of the visited pages
+TALLY_STEPS = 64
+
+# Surfers walk until their starting page matters less than this
+BURN_IN_BIAS = 0.001
+
+
+def sample_visits(graph, damping_factor, n, walkers=1024, seed=None):
+    """
+    Return how many times each page of `graph` is visited in `n`
+    samples of the random surfer model.
+
+    `walkers` independent surfers start on random pages and are all
+    moved one step at a time with vectorized NumPy operations. At each
+    step a surfer follows a uniformly chosen link with probability
+    `damping_factor`, and otherwise (or if its page has no links)
+    jumps to a uniformly chosen page. This is the same distribution as
+    `transition_model`, drawn in constant time from the CSR arrays
+    instead of from a table over every page.
+
+    Each surfer first takes a few unrecorded steps, so that its random
+    start does not skew the estimate when there are many surfers.
+    """
+    rng = np.random.default_rng(seed)
+    pages = len(graph)
+    walkers = max(1, min(walkers, n))
+    counts = np.zeros(pages, dtype=np.int64)
+    position = rng.integers(pages, size=walkers)
+    for _ in range(burn_in(damping_factor)):
+        position = _step(graph, position, damping_factor, rng)
+
+    recorded, remaining = [], n
+    while remaining > 0:
+        recorded.append(position[:remaining])
+        remaining -= len(recorded[-1])
+        if len(recorded) == TALLY_STEPS or remaining <= 0:
+            counts += np.bincount(np.concatenate(recorded), minlength=pages)
+            recorded = []
+        if remaining > 0:
+            position = _step(graph, position, damping_factor, rng)
+    return counts
+
+
+def burn_in(damping_factor):
+    """
+    Return the number of steps after which a surfer's start affects
+    where it is by less than BURN_IN_BIAS: each step keeps following
+    links with probability `damping_factor` at most.
+    """
+    if damping_factor <= 0:
+        return 0
+    if damping_factor >= 1:
+        return 100
+    return math.ceil(math.log(BURN_IN_BIAS) / math.log(damping_factor))
+
+
+def _step(graph, position, damping_factor, rng):
+    """
+    Return the pages the surfers at `position` move to next.
+    """
+    degree = graph.out_degree[position]
+    follow = (rng.random(len(position)) < damping_factor) & (degree > 0)
+    following = position[follow]
+    choice = (rng.random(len(following)) * degree[follow]).astype(np.int64)
+    position = rng.integers(len(graph), size=len(position))
+    position[follow] = graph.out_targets[graph.out_start[following] + choice]
+    return position
+
+
+# Graph shared with forked workers by `parallel_sample`
+_shared_graph = None
+
+
+def parallel_sample(graph, damping_factor, accuracy, max_samples,
+                    workers=None, seed=0, batch_samples=None, walkers=1024):
+    """
+    Estimate PageRank with independent batches of random surfers spread
+    over a pool of `workers` processes, stopping once every page's
+    standard error is below `accuracy` or `max_samples` have been drawn.
+    The last round is trimmed so no more than `max_samples` are drawn.
+
+    Each batch gets its own RNG seeded from (`seed`, round, worker),
+    so results are reproducible for a given seed and worker count.
+    The standard error of a page is the spread of its per-batch
+    estimates divided by the square root of the number of batches.
+
+    Return (ranks, standard_error, samples) with ranks and errors as
+    arrays over the pages of `graph`.
+    """
+    global _shared_graph
+    workers = workers or os.cpu_count() or 1
+    if batch_samples is None:
+        batch_samples = min(100000, max(1000, max_samples // (workers * 4)))
+
+    estimates, samples, round_number = [], 0, 0
+    _shared_graph = graph
+    context = multiprocessing.get_context("fork")
+    pool = context.Pool(workers) if workers > 1 else None
+    try:
+        while samples < max_samples:
+            # Split what is left of the budget so no round overshoots it
+            budget = min(batch_samples * workers, max_samples - samples)
+            sizes = [budget // workers + (worker < budget % workers)
+                     for worker in range(workers)]
+            tasks = [
+                (seed, round_number, worker, damping_factor, size, walkers)
+                for worker, size in enumerate(sizes) if size
+            ]
+            batches = pool.map(_sample_batch, tasks) if pool else map(
+                _sample_batch, tasks)
+            for task, counts in zip(tasks, batches):
+                estimates.append(counts / counts.sum())
+                samples += task[4]
+            round_number += 1
+
+            if len(estimates) > 1:
+                error = _standard_error(estimates)
+                if error.max() < accuracy:
+                    break
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        _shared_graph = None
+
+    ranks = np.mean(estimates, axis=0)
+    error = (_standard_error(estimates) if len(estimates) > 1
+             else np.full(len(graph), np.inf))
+    return ranks, error, samples
+
+
+def _sample_batch(task):
+    """
+    Run one batch of `parallel_sample` on the shared graph.
+    """
+    seed, round_number, worker, damping_factor, samples, walkers = task
+    sequence = np.random.SeedSequence(seed, spawn_key=(round_number, worker))
+    return sample_visits(_shared_graph, damping_factor, samples, walkers,
+                         seed=sequence)
+
+
+def _standard_error(estimates):
+    """
+    Return the standard error of the mean of per-batch estimates.
+    """
+    return np.std(estimates, axis=0, ddof=1) / math.sqrt(len(estimates))
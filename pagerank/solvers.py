@@ -0,0 +1,361 @@
+import time
+
+import numpy as np
+
+try:
+    import scipy.sparse
+except ImportError:
+    scipy = None
+
+# Elements of the intermediate arrays when pulling a rank matrix along
+# links without scipy; small enough to stay in cache
+BLOCK_ELEMENTS = 2 ** 16
+
+
+def link_operator(graph):
+    """
+    Return a function computing, for a rank vector `x`, the rank each
+    page receives along links: sum of x[j] / out_degree[j] over the
+    pages j linking to it. Dangling pages pass nothing on.
+
+    `x` may also be a matrix with one rank vector per column.
+
+    Uses a scipy CSR matrix when scipy is installed, and otherwise
+    `pull`, which sums shares with np.add.reduceat over the incoming
+    links, a cache-sized block of pages at a time for a matrix.
+    """
+    n = len(graph)
+    inverse_degree = np.zeros(n)
+    np.divide(1.0, graph.out_degree, out=inverse_degree,
+              where=~graph.dangling)
+
+    if scipy is not None:
+        matrix = scipy.sparse.csr_matrix(
+            (inverse_degree[graph.in_sources], graph.in_sources,
+             graph.in_start),
+            shape=(n, n))
+        return matrix.dot
+
+    def apply(x):
+        # Divide each page's rank among its links once, then gather
+        shares = x * inverse_degree.reshape((-1,) + (1,) * (x.ndim - 1))
+        if x.ndim == 1:
+            return pull(graph.in_start, graph.in_sources, shares, 0, n)
+
+        # Pull a matrix through a cache-sized group of links at a time
+        step = max(1, BLOCK_ELEMENTS // x.shape[1])
+        bounds = np.unique(np.append(
+            np.searchsorted(graph.in_start, np.arange(0, graph.edges, step)),
+            [0, n]))
+        result = np.empty(x.shape)
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            result[lo:hi] = pull(graph.in_start, graph.in_sources, shares,
+                                 lo, hi)
+        return result
+    return apply
+
+
+def pull(in_start, in_sources, shares, lo, hi):
+    """
+    Return the sum of `shares` over the incoming links of pages lo..hi-1,
+    given a graph's incoming-link arrays.
+    """
+    begin, end = in_start[lo], in_start[hi]
+    result = np.zeros((hi - lo,) + shares.shape[1:])
+    if end > begin:
+        starts = np.asarray(in_start[lo:hi + 1])
+        linked = starts[1:] > starts[:-1]
+        result[linked] = np.add.reduceat(
+            shares[in_sources[begin:end]], starts[:-1][linked] - begin,
+            axis=0)
+    return result
+
+
+class Convergence():
+    """
+    Outcome of an iterative solver: the PageRank vector `ranks`, the L1
+    change each iteration made to it in `residuals`, and the wall-clock
+    `seconds` taken. `converged` is False if the solver stopped at its
+    iteration cap instead.
+    """
+
+    def __init__(self, ranks, residuals, seconds, converged):
+        self.ranks = ranks
+        self.residuals = residuals
+        self.seconds = seconds
+        self.converged = converged
+
+    @property
+    def iterations(self):
+        return len(self.residuals)
+
+
+def power_iteration(graph, damping_factor, tolerance, max_iterations=1000,
+                    start=None):
+    """
+    Return the PageRank vector of `graph` by power iteration, stopping
+    once an iteration changes the ranks by at most `tolerance` in total
+    (L1 norm).
+
+    Dangling pages are not expanded into links to every page: their
+    combined rank is spread evenly over all pages in one step.
+
+    Iteration starts from the uniform vector, or from `start` (rescaled
+    to sum to 1) when warm-starting from an earlier solution.
+    """
+    return jacobi(graph, damping_factor, tolerance, max_iterations,
+                  start).ranks
+
+
+def jacobi(graph, damping_factor, tolerance, max_iterations=1000,
+           start=None):
+    """
+    Solve for PageRank by the power method, which for PageRank is the
+    Jacobi iteration: every page is updated from the previous ranks.
+    Return a Convergence.
+    """
+    clock = time.perf_counter()
+    apply = link_operator(graph)
+    ranks = _start(graph, start)
+    residuals = []
+    for _ in range(max_iterations):
+        new_ranks = _step(graph, apply, ranks, damping_factor)
+        residuals.append(np.abs(new_ranks - ranks).sum())
+        ranks = new_ranks
+        if residuals[-1] <= tolerance:
+            break
+    return _result(ranks, residuals, clock, tolerance)
+
+
+def block_power_iteration(graph, damping_factor, teleports, tolerance,
+                          max_iterations=1000):
+    """
+    Return personalized PageRank vectors of `graph` for every column of
+    `teleports`, an (n, k) matrix whose columns are the distributions a
+    surfer jumps to instead of a uniformly chosen page. A surfer on a
+    dangling page jumps the same way.
+
+    All k vectors are iterated together as one matrix, so each sweep
+    reads the links once rather than once per vector. A column is set
+    aside once an iteration changes it by at most `tolerance` (L1
+    norm), and iteration stops when every column has been.
+
+    Raises ValueError if a column has a negative entry or sums to zero.
+    """
+    teleports = np.asarray(teleports, dtype=float)
+    totals = teleports.sum(axis=0)
+    invalid = (teleports < 0).any(axis=0) | ~(totals > 0)
+    if invalid.any():
+        raise ValueError(
+            f"teleport columns {np.flatnonzero(invalid).tolist()} must be "
+            "nonnegative with a positive sum")
+    teleports = teleports / totals
+    apply = link_operator(graph)
+    result = teleports.copy()
+    active = np.arange(teleports.shape[1])
+    ranks = result
+    for _ in range(max_iterations):
+        dangling_rank = ranks[graph.dangling].sum(axis=0)
+        new_ranks = damping_factor * apply(ranks)
+        new_ranks += (damping_factor * dangling_rank +
+                      1 - damping_factor) * teleports
+        change = np.abs(new_ranks - ranks).sum(axis=0)
+        ranks = new_ranks
+
+        done = change <= tolerance
+        if done.any():
+            result[:, active[done]] = ranks[:, done]
+            active, ranks, teleports = (
+                active[~done], ranks[:, ~done], teleports[:, ~done])
+            if not len(active):
+                break
+    result[:, active] = ranks
+    return result
+
+
+def gauss_seidel(graph, damping_factor, tolerance, max_iterations=1000,
+                 start=None):
+    """
+    Solve for PageRank by Gauss-Seidel sweeps, updating pages in place
+    so each one already sees the new ranks of the pages before it.
+    Return a Convergence.
+
+    As in `iterate_pagerank`, the rank of the dangling pages is kept as
+    a running total, and so is the rank of all pages, which sets the
+    random-visit share. That makes the sweep solve the eigenproblem
+    rather than the linear system, whose total rank would otherwise
+    only converge at the rate of `damping_factor`. A sweep is
+    inherently sequential, so it runs in pure Python; it needs fewer
+    sweeps than `jacobi` but each one costs more.
+    """
+    clock = time.perf_counter()
+    n = len(graph)
+    ranks = _start(graph, start).tolist()
+    dangling = graph.dangling.tolist()
+    weights = (1 / np.maximum(graph.out_degree, 1))[graph.in_sources]
+    incoming = [
+        list(zip(graph.in_sources[begin:end].tolist(),
+                 weights[begin:end].tolist()))
+        for begin, end in zip(graph.in_start[:-1], graph.in_start[1:])
+    ]
+    dangling_rank = sum(rank for rank, empty in zip(ranks, dangling) if empty)
+    total = sum(ranks)
+
+    residuals = []
+    for _ in range(max_iterations):
+        change = 0.0
+        for page in range(n):
+            received = sum(ranks[source] * weight
+                           for source, weight in incoming[page])
+            new_rank = (damping_factor * (received + dangling_rank / n) +
+                        (1 - damping_factor) * total / n)
+            difference = new_rank - ranks[page]
+            change += abs(difference)
+            if dangling[page]:
+                dangling_rank += difference
+            total += difference
+            ranks[page] = new_rank
+
+        # Keep the ranks summing to 1, so `change` is measured on the
+        # same scale as the other solvers
+        ranks = [rank / total for rank in ranks]
+        dangling_rank /= total
+        total = 1.0
+        residuals.append(change)
+        if change <= tolerance:
+            break
+    ranks = np.array(ranks)
+    return _result(ranks / ranks.sum(), residuals, clock, tolerance)
+
+
+def quadratic_extrapolation(graph, damping_factor, tolerance,
+                            max_iterations=1000, start=None, period=10):
+    """
+    Solve for PageRank by power iteration, replacing the ranks every
+    `period` iterations with a quadratic extrapolation from the last
+    four iterates (Kamvar et al., 2003). This cancels the slowest
+    decaying error terms, which dominate when `damping_factor` is
+    close to 1. Return a Convergence.
+    """
+    return _extrapolated(graph, damping_factor, tolerance, max_iterations,
+                         start, period, _quadratic)
+
+
+def aitken_extrapolation(graph, damping_factor, tolerance,
+                         max_iterations=1000, start=None, period=10):
+    """
+    Solve for PageRank by power iteration, replacing the ranks every
+    `period` iterations with an Aitken delta-squared extrapolation of
+    each page from the last three iterates. Return a Convergence.
+    """
+    return _extrapolated(graph, damping_factor, tolerance, max_iterations,
+                         start, period, _aitken)
+
+
+def _extrapolated(graph, damping_factor, tolerance, max_iterations, start,
+                  period, extrapolate):
+    """
+    Power iteration with `extrapolate(history)` applied to the recent
+    iterates every `period` iterations. An extrapolation is kept only if
+    the step after it changes the ranks less than the step before it.
+    """
+    clock = time.perf_counter()
+    apply = link_operator(graph)
+    ranks = _start(graph, start)
+    history = [ranks]
+    residuals = []
+    rejected = None
+    for iteration in range(1, max_iterations + 1):
+        new_ranks = _step(graph, apply, ranks, damping_factor)
+        residual = np.abs(new_ranks - ranks).sum()
+
+        # Undo an extrapolation that moved away from the solution
+        if rejected is not None and residual > residuals[-1]:
+            ranks = rejected
+            new_ranks = _step(graph, apply, ranks, damping_factor)
+            residual = np.abs(new_ranks - ranks).sum()
+        rejected = None
+
+        residuals.append(residual)
+        ranks = new_ranks
+        if residual <= tolerance:
+            break
+        history = history[-3:] + [ranks]
+        if iteration % period == 0 and len(history) == 4:
+            extrapolated = extrapolate(history)
+            if extrapolated is not None:
+                rejected, ranks = ranks, extrapolated
+                history = [ranks]
+    return _result(ranks, residuals, clock, tolerance)
+
+
+def _quadratic(history):
+    """
+    Return the quadratic extrapolation of the iterates in `history`,
+    oldest first, or None if they do not determine one.
+    """
+    x3, x2, x1, x0 = history
+    y = np.column_stack((x2 - x3, x1 - x3))
+    gamma, *_ = np.linalg.lstsq(y, x3 - x0, rcond=None)
+    gamma1, gamma2 = gamma
+    ranks = (gamma1 + gamma2 + 1) * x2 + (gamma2 + 1) * x1 + x0
+    return _normalized(ranks)
+
+
+def _aitken(history):
+    """
+    Return the Aitken extrapolation of the last three iterates in
+    `history`, leaving pages whose ranks have stopped moving as they are.
+    """
+    x2, x1, x0 = history[-3:]
+    first = x1 - x2
+    second = x0 - 2 * x1 + x2
+    ranks = x0.copy()
+    moving = np.abs(second) > 1e-15
+    ranks[moving] = x2[moving] - first[moving] ** 2 / second[moving]
+    return _normalized(ranks)
+
+
+def _normalized(ranks):
+    """
+    Return `ranks` rescaled to sum to 1, or None if extrapolation made
+    any of them invalid.
+    """
+    if not np.all(np.isfinite(ranks)) or np.any(ranks <= 0):
+        return None
+    return ranks / ranks.sum()
+
+
+def _start(graph, start):
+    """
+    Return the starting vector: uniform, or `start` rescaled to sum to 1.
+    """
+    if start is None:
+        return np.full(len(graph), 1 / len(graph))
+    return np.asarray(start, dtype=float) / np.sum(start)
+
+
+def _step(graph, apply, ranks, damping_factor):
+    """
+    Return one power iteration step from `ranks`.
+    """
+    dangling_rank = ranks[graph.dangling].sum()
+    return (damping_factor * (apply(ranks) + dangling_rank / len(graph)) +
+            (1 - damping_factor) / len(graph))
+
+
+def _result(ranks, residuals, clock, tolerance):
+    """
+    Return a Convergence for a solver started at `clock`.
+    """
+    return Convergence(ranks, residuals, time.perf_counter() - clock,
+                       bool(residuals) and residuals[-1] <= tolerance)
+
+
+# Solvers selectable with `--solver`
+SOLVERS = {
+    "jacobi": jacobi,
+    "gauss-seidel": gauss_seidel,
+    "quadratic": quadratic_extrapolation,
+    "aitken": aitken_extrapolation,
+}